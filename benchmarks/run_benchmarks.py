@@ -0,0 +1,370 @@
+"""
+Benchmarks of the chickpea render pipeline.
+
+Each benchmark is run a number of times for the wall time and once more
+under tracemalloc for the peak memory allocated while it ran. Results are
+written as JSON so that runs on different commits can be compared, eg
+
+    $ python benchmarks/run_benchmarks.py -o before.json
+    $ git checkout other_branch
+    $ python benchmarks/run_benchmarks.py -o after.json
+    $ python benchmarks/run_benchmarks.py --compare before.json after.json
+
+Use --quick for a smaller set of sizes and -k to only run benchmarks whose
+name contains a string.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from chickpea import Segment, Waveform, Element, Sequence  # noqa: E402
+from chickpea import segment_functions as sf  # noqa: E402
+
+try:
+    from chickpea.segment import points_cache
+except ImportError:
+    points_cache = None
+
+BENCHMARKS = []
+
+# attributes holding cached renders and checks on commits which have them
+_CACHES = {'_points_key_cache': (None, None), '_rendered': None,
+           '_rendered_markers': None, '_offsets': None, '_validated': None}
+
+
+def _clear_caches(*objs):
+    """
+    Function which clears the render and validation caches so that each
+    timed run renders (or checks) from scratch, tolerating commits without
+    some of the caches so that results can be compared across commits.
+    """
+    if points_cache is not None:
+        points_cache.clear()
+    for obj in objs:
+        for attr, empty in _CACHES.items():
+            if hasattr(obj, attr):
+                setattr(obj, attr, empty)
+
+
+def benchmark(name, **params):
+    """
+    Decorator which registers a benchmark for each combination of the
+    parameter values given.
+
+    Args:
+        name: name of the benchmark
+        params: lists of values for each keyword argument of the decorated
+            function, which should do any setup and return a function (of
+            no arguments) running the part to be timed
+    """
+    def decorator(make):
+        keys = list(params)
+        combos = [{}]
+        for k in keys:
+            combos = [dict(c, **{k: v}) for c in combos for v in params[k]]
+        for c in combos:
+            BENCHMARKS.append((name, c, make))
+        return make
+    return decorator
+
+
+def _segment(func, SR, dur, **func_args):
+    if func in (sf.gaussian, sf.gaussian_derivative):
+        func_args.setdefault('sigma', dur / 8)
+        func_args.setdefault('sigma_cutoff', 4)
+        func_args.setdefault('amp', 1)
+    elif func is sf.ramp:
+        func_args.update(start=0, stop=1, dur=dur)
+    elif func is sf.stairs:
+        func_args.update(start=0, stop=1, step=0.01, dur=dur)
+    else:
+        func_args.update(amp=0.5, dur=dur)
+    func_args['SR'] = SR
+    return Segment(name=func.__name__, gen_func=func, func_args=func_args)
+
+
+def _waveform(SR, dur, segments, channel=1, markers=True):
+    seg_dur = dur / segments
+    funcs = [sf.flat, sf.gaussian, sf.ramp, sf.gaussian_derivative]
+    waveform = Waveform(channel=channel, segment_list=[
+        _segment(funcs[i % len(funcs)], SR, seg_dur)
+        for i in range(segments)], sample_rate=SR)
+    if markers:
+        for i, seg in enumerate(waveform.segment_list):
+            seg.add_bound_marker(1 + i % 2, 0, seg_dur / 4, time=True)
+    return waveform
+
+
+def _element(SR, dur, channels, segments=3):
+    element = Element(sample_rate=SR)
+    for ch in range(1, channels + 1):
+        element.add_waveform(_waveform(SR, dur, segments, channel=ch))
+    return element
+
+
+def _sequence(SR, dur, elements, channels):
+    # only uses the API of the first commit so that any commit can be run
+    template = _element(SR, dur, channels)
+    sequence = Sequence(sample_rate=SR)
+    for amp in np.linspace(0, 1, elements):
+        element = template.copy()
+        element[1].segment_list[1].func_args['amp'] = amp
+        sequence.add_element(element)
+    return sequence
+
+
+@benchmark('segment_points',
+           func=['flat', 'ramp', 'gaussian', 'gaussian_derivative', 'stairs'],
+           SR=[1.2e9, 2.4e9], dur=[1e-6, 100e-6])
+def bench_segment_points(func, SR, dur):
+    seg = _segment(getattr(sf, func), SR, dur)
+
+    def run():
+        _clear_caches(seg)
+        return seg.points
+    return run
+
+
+@benchmark('waveform_wave', SR=[1.2e9, 2.4e9], dur=[10e-6, 100e-6],
+           segments=[10, 1000])
+def bench_waveform_wave(SR, dur, segments):
+    waveform = _waveform(SR, dur, segments)
+
+    def run():
+        _clear_caches(waveform)
+        return waveform.wave
+    return run
+
+
+@benchmark('waveform_markers', SR=[1.2e9, 2.4e9], dur=[10e-6, 100e-6],
+           segments=[10, 1000])
+def bench_waveform_markers(SR, dur, segments):
+    waveform = _waveform(SR, dur, segments)
+
+    def run():
+        _clear_caches(waveform)
+        return waveform.markers
+    return run
+
+
+@benchmark('segment_add', SR=[1.2e9, 2.4e9], dur=[1e-6, 100e-6])
+def bench_segment_add(SR, dur):
+    a = _segment(sf.gaussian, SR, dur)
+    b = _segment(sf.ramp, SR, dur)
+    a.add_bound_marker(1, 0, len(a) // 2)
+    b.add_bound_marker(2, 0, len(b) // 2)
+
+    def run():
+        _clear_caches(a, b)
+        return (a + b).points
+    return run
+
+
+@benchmark('element_copy', SR=[2.4e9], dur=[1e-6, 100e-6],
+           channels=[1, 4, 8])
+def bench_element_copy(SR, dur, channels):
+    element = _element(SR, dur, channels)
+    for waveform in element.values():
+        waveform.wave
+
+    def run():
+        return element.copy()
+    return run
+
+
+@benchmark('sequence_check', SR=[1.2e9], dur=[1e-6, 10e-6],
+           elements=[10, 1000, 10000], channels=[1, 4])
+def bench_sequence_check(SR, dur, elements, channels):
+    sequence = _sequence(SR, dur, elements, channels)
+
+    def run():
+        for element in sequence:
+            _clear_caches(element, *element.values())
+        return sequence.check()
+    return run
+
+
+@benchmark('sequence_unwrap', SR=[1.2e9, 2.4e9],
+           size=[(10, 100e-6), (1000, 10e-6), (10000, 1e-6)],
+           channels=[1, 4, 8])
+def bench_sequence_unwrap(SR, size, channels):
+    elements, dur = size
+    sequence = _sequence(SR, dur, elements, channels)
+
+    def run():
+        for element in sequence:
+            _clear_caches(*element.values())
+        return sequence.unwrap()
+    return run
+
+
+@benchmark('sequence_wrap', SR=[1.2e9],
+           size=[(10, 100e-6), (1000, 10e-6), (10000, 1e-6)],
+           channels=[1, 4])
+def bench_sequence_wrap(SR, size, channels):
+    elements, dur = size
+    unwrapped = _sequence(SR, dur, elements, channels).unwrap()[0]
+
+    def run():
+        sequence = Sequence()
+        sequence.wrap((unwrapped, {}))
+        return sequence
+    return run
+
+
+QUICK = {'dur': [1e-6, 10e-6], 'segments': [10], 'elements': [10, 1000],
+         'size': [(10, 100e-6), (1000, 10e-6)], 'channels': [1, 4]}
+
+
+def _quick(params):
+    for k, values in QUICK.items():
+        if k in params and params[k] not in values:
+            return False
+    return True
+
+
+def _run_one(make, params, repeat):
+    run = make(**params)
+    run()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(keyword=None, quick=False, repeat=5, verbose=True):
+    """
+    Function which runs the registered benchmarks.
+
+    Args:
+        keyword: optional string, only benchmarks with names containing it
+            are run
+        quick: if True only run the smaller sizes
+        repeat: number of timed runs of each benchmark
+        verbose: print a line for each benchmark to stderr as it finishes
+
+    Benchmarks which raise (eg on older commits without some of the api)
+    are recorded with the error instead of times.
+
+    Returns:
+        dict of the machine, commit and a list of results with the
+        times (s) of each run and the peak traced memory (bytes), or the
+        error raised
+    """
+    results = []
+    for name, params, make in BENCHMARKS:
+        if keyword is not None and keyword not in name:
+            continue
+        if quick and not _quick(params):
+            continue
+        try:
+            times, peak = _run_one(make, params, repeat)
+        except Exception as e:
+            # recorded so that the rest of the suite still runs, eg on
+            # commits with api which is missing or broken
+            results.append({'name': name, 'params': params,
+                            'error': repr(e)})
+            if verbose:
+                print('{:<18} {:<70} error: {!r}'.format(
+                    name, json.dumps(params), e), file=sys.stderr)
+            continue
+        result = {'name': name, 'params': params, 'times': times,
+                  'min': min(times), 'median': float(np.median(times)),
+                  'peak_bytes': peak}
+        results.append(result)
+        if verbose:
+            print('{:<18} {:<70} {:>10.3f} ms {:>10.1f} MB'.format(
+                name, json.dumps(params), 1e3 * result['min'],
+                peak / 2**20), file=sys.stderr)
+    return {'commit': _commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.platform(),
+            'repeat': repeat,
+            'results': results}
+
+
+def compare(before, after):
+    """
+    Function which prints the ratio of the minimum times and peak memory
+    of the benchmarks found in both of two result files, or the errors of
+    those which raised in either.
+    """
+    with open(before) as f:
+        old = {(r['name'], json.dumps(r['params'], sort_keys=True)): r
+               for r in json.load(f)['results']}
+    with open(after) as f:
+        new = json.load(f)['results']
+    for r in new:
+        key = (r['name'], json.dumps(r['params'], sort_keys=True))
+        if key not in old:
+            continue
+        o = old[key]
+        if 'error' in r or 'error' in o:
+            print('{:<18} {:<70} error before: {} after: {}'.format(
+                r['name'], key[1], o.get('error'), r.get('error')))
+            continue
+        print('{:<18} {:<70} time x{:<8.2f} memory x{:.2f}'.format(
+            r['name'], key[1], r['min'] / o['min'],
+            r['peak_bytes'] / max(o['peak_bytes'], 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-k', '--keyword', default=None,
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('--quick', action='store_true',
+                        help='only run the smaller sizes')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='number of timed runs of each benchmark')
+    parser.add_argument('-o', '--output', default=None,
+                        help='file to write the JSON results to '
+                             '(default stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = run_benchmarks(args.keyword, args.quick, args.repeat)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
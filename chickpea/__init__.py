@@ -1,4 +1,4 @@
-from .segment import Segment
+from .segment import Segment, CompositeSegment
 from .waveform import Waveform
 from .element import Element
-from .sequence import Sequence
\ No newline at end of file
+from .sequence import Sequence, LazySequence
@@ -0,0 +1,438 @@
+import datetime
+import struct
+from typing import Union
+
+import numpy as np
+
+# number of samples converted at once when packing, small enough that the
+# scratch buffers stay in cache
+_BLOCK = 2**16
+
+DAC_MAX = 2**14 - 2
+M1_BIT = 1 << 14
+M2_BIT = 1 << 15
+
+# WAVEFORM_TYPE values: uint16 per sample (see pack_waveform) or a float32
+# wave value followed by a byte with marker 1 and 2 as bits 6 and 7
+INTEGER = 1
+REAL = 2
+REAL_M1_BIT = 1 << 6
+REAL_M2_BIT = 1 << 7
+_REAL_DTYPE = np.dtype([('wave', '<f4'), ('markers', 'u1')])
+
+
+def pack_waveform(wave, m1, m2, amplitude: float = 1.0,
+                  out: np.ndarray = None):
+    """
+    Function which converts a wave and markers into the AWG5014 integer
+    format: the wave scaled to amplitude, clipped and quantised to a 14 bit
+    DAC code with marker 1 and 2 as bits 14 and 15 of one uint16 per
+    sample. Works block by block through small scratch buffers so the only
+    full length allocation is the output.
+
+    Args:
+        wave (numpy array): wave, -amplitude to amplitude maps onto the
+            full DAC range
+        m1 (numpy array): marker 1 array of 0s and 1s
+        m2 (numpy array): marker 2 array of 0s and 1s
+        amplitude: wave value corresponding to full scale (default 1)
+        out (numpy array): optional uint16 array to write into
+
+    Returns:
+        packed (uint16 numpy array)
+        clipped (int): number of samples outside -amplitude to amplitude
+    """
+    length = len(wave)
+    if len(m1) != length or len(m2) != length:
+        raise ValueError('wave and markers must have the same length: '
+                         '{}, {}, {}'.format(length, len(m1), len(m2)))
+    if out is None:
+        out = np.empty(length, dtype=np.uint16)
+    elif out.dtype != np.uint16 or len(out) != length:
+        raise ValueError('out must be a uint16 array of length '
+                         '{}'.format(length))
+    half = DAC_MAX / 2
+    scale = half / amplitude
+    scratch = np.empty(min(length, _BLOCK))
+    bits = np.empty(min(length, _BLOCK), dtype=np.uint16)
+    clipped = 0
+    for start in range(0, length, _BLOCK):
+        stop = min(start + _BLOCK, length)
+        n = stop - start
+        f = scratch[:n]
+        b = bits[:n]
+        np.multiply(wave[start:stop], scale, out=f)
+        f += half + 0.5
+        clipped += (np.count_nonzero(f < 0.5) +
+                    np.count_nonzero(f > DAC_MAX + 0.5))
+        np.clip(f, 0.5, DAC_MAX + 0.5, out=f)
+        o = out[start:stop]
+        np.copyto(o, f, casting='unsafe')
+        np.not_equal(m1[start:stop], 0, out=b, casting='unsafe')
+        b *= M1_BIT
+        o |= b
+        np.not_equal(m2[start:stop], 0, out=b, casting='unsafe')
+        b *= M2_BIT
+        o |= b
+    return out, int(clipped)
+
+
+def unpack_waveform(packed: np.ndarray):
+    """
+    Function which converts an AWG5014 uint16 array back into a wave and
+    markers (inverse of pack_waveform for amplitude 1).
+
+    Args:
+        packed (uint16 numpy array)
+
+    Returns:
+        wave (numpy array), m1 (uint8 numpy array), m2 (uint8 numpy array)
+    """
+    packed = np.asarray(packed)
+    wave = (packed & (M1_BIT - 1)).astype(np.float64)
+    wave -= DAC_MAX / 2
+    wave /= DAC_MAX / 2
+    m1 = ((packed & M1_BIT) != 0).view(np.uint8)
+    m2 = ((packed & M2_BIT) != 0).view(np.uint8)
+    return wave, m1, m2
+
+
+def unpack_real_waveform(data: np.ndarray):
+    """
+    Function which converts the data of a real AWG5014 waveform (float32
+    wave value and marker byte per sample) into a wave and markers.
+
+    Args:
+        data (uint8 numpy array): 5 bytes per sample
+
+    Returns:
+        wave (numpy array), m1 (uint8 numpy array), m2 (uint8 numpy array)
+    """
+    data = np.asarray(data).view(_REAL_DTYPE)
+    wave = data['wave'].astype(np.float64)
+    m1 = ((data['markers'] & REAL_M1_BIT) != 0).view(np.uint8)
+    m2 = ((data['markers'] & REAL_M2_BIT) != 0).view(np.uint8)
+    return wave, m1, m2
+
+
+# struct formats of the records written and understood by this module,
+# numbered records are listed without their number
+_RECORD_FORMATS = {'MAGIC': 'h',
+                   'VERSION': 'h',
+                   'SAMPLING_RATE': 'd',
+                   'RUN_MODE': 'h',
+                   'WAVEFORM_NAME': 's',
+                   'WAVEFORM_TYPE': 'h',
+                   'WAVEFORM_LENGTH': 'l',
+                   'WAVEFORM_TIMESTAMP': '8H',
+                   'SEQUENCE_WAIT': 'h',
+                   'SEQUENCE_LOOP': 'l',
+                   'SEQUENCE_JUMP': 'h',
+                   'SEQUENCE_GOTO': 'h',
+                   'SEQUENCE_WAVEFORM_NAME_CH': 's'}
+
+# first number of user defined waveforms
+_FIRST_WAVEFORM = 21
+
+
+def _pack_record(name: str, value, fmt: str):
+    """
+    Function which packs a record of the .awg format: the sizes of the
+    null terminated name and of the data followed by the name and data.
+    """
+    if fmt == 's':
+        data = value.encode('ASCII') + b'\x00'
+    elif len(fmt) == 1:
+        data = struct.pack('<' + fmt, value)
+    else:
+        data = struct.pack('<' + fmt, *value)
+    name = name.encode('ASCII') + b'\x00'
+    return struct.pack('<II', len(name), len(data)) + name + data
+
+
+def _record_format(name: str):
+    base = name.rstrip('0123456789').rstrip('_')
+    if base.startswith('SEQUENCE_WAVEFORM_NAME_CH'):
+        base = 'SEQUENCE_WAVEFORM_NAME_CH'
+    return _RECORD_FORMATS.get(base)
+
+
+def write_awg_file(sequence, file, awg: int = 0,
+                   amplitude: Union[float, dict] = 1.0,
+                   deduplicate: bool = True, settings: dict = None):
+    """
+    Function which writes the channels of one AWG of a sequence to an
+    AWG5014 .awg sequence file. Elements are rendered, packed and written
+    one at a time (dropping any render caches this creates) so memory use
+    is bounded by one element, and the sequencing table is written after
+    the waveforms.
+
+    Args:
+        sequence: Sequence to write
+        file: path or binary file handle to write to
+        awg: index of the AWG whose channels (4 * awg + 1 to 4 * awg + 4
+            of the sequence) are written (default 0)
+        amplitude: wave value corresponding to full scale, either one
+            value or a dict of the form {channel: amplitude}
+        deduplicate: if True waveforms with identical content (see
+            Waveform.digest) are written once and shared in the table
+        settings: optional dict of extra records of the form
+            {name: (value, struct format)}, eg {'RUN_MODE': (4, 'h')}
+
+    Returns:
+        dict of stats: waveforms (number written), samples, clipped
+    """
+    if isinstance(file, str):
+        with open(file, 'wb') as f:
+            return write_awg_file(sequence, f, awg=awg, amplitude=amplitude,
+                                  deduplicate=deduplicate, settings=settings)
+    channels = sequence._get_awg_channels().get(awg)
+    if channels is None:
+        raise ValueError('sequence uses no channels of awg {}'.format(awg))
+    records = {'MAGIC': (5000, 'h'), 'VERSION': (1, 'h'),
+               'RUN_MODE': (4, 'h')}
+    if sequence.sample_rate is not None:
+        records['SAMPLING_RATE'] = (float(sequence.sample_rate), 'd')
+    records.update(settings or {})
+    for name, (value, fmt) in records.items():
+        file.write(_pack_record(name, value, fmt))
+
+    now = datetime.datetime.now()
+    timestamp = (now.year, now.month, now.isoweekday() % 7, now.day,
+                 now.hour, now.minute, now.second, now.microsecond // 1000)
+    stats = {'waveforms': 0, 'samples': 0, 'clipped': 0}
+    names = {}
+    table = []
+    out = np.empty(0, dtype=np.uint16)
+    for j, element in enumerate(sequence):
+        element_names = {}
+        for ch in channels:
+            chan = awg * 4 + ch
+            waveform = element[chan]
+            amp = (amplitude[chan] if isinstance(amplitude, dict)
+                   else amplitude)
+            # digest renders the waveform so check whether it was rendered
+            # first, the digest itself stays cached after the release
+            was_rendered = waveform._is_rendered()
+            key = (waveform.digest(), amp) if deduplicate else None
+            if key in names:
+                if not was_rendered:
+                    waveform._release()
+                element_names[ch] = names[key]
+                continue
+            length = len(waveform)
+            if len(out) != length:
+                out = np.empty(length, dtype=np.uint16)
+            packed, clipped = waveform.pack(amplitude=amp, out=out)
+            if not was_rendered:
+                waveform._release()
+            number = _FIRST_WAVEFORM + stats['waveforms']
+            name = 'wfm{:03d}ch{}'.format(j + 1, ch)
+            file.write(
+                _pack_record('WAVEFORM_NAME_{}'.format(number), name, 's') +
+                _pack_record('WAVEFORM_TYPE_{}'.format(number), 1, 'h') +
+                _pack_record('WAVEFORM_LENGTH_{}'.format(number), length,
+                             'l') +
+                _pack_record('WAVEFORM_TIMESTAMP_{}'.format(number),
+                             timestamp, '8H'))
+            data_name = 'WAVEFORM_DATA_{}'.format(number).encode(
+                'ASCII') + b'\x00'
+            file.write(struct.pack('<II', len(data_name), 2 * length) +
+                       data_name)
+            file.write(memoryview(packed.astype('<u2', copy=False)))
+            if deduplicate:
+                names[key] = name
+            element_names[ch] = name
+            stats['waveforms'] += 1
+            stats['samples'] += length
+            stats['clipped'] += clipped
+        table.append(element_names)
+
+    nreps, trig_waits, goto_states, jump_tos = \
+        sequence._get_sequencing_lists()
+    for j, element_names in enumerate(table):
+        n = j + 1
+        file.write(
+            _pack_record('SEQUENCE_WAIT_{}'.format(n), int(trig_waits[j]),
+                         'h') +
+            _pack_record('SEQUENCE_LOOP_{}'.format(n), int(nreps[j]), 'l') +
+            _pack_record('SEQUENCE_JUMP_{}'.format(n), int(jump_tos[j]),
+                         'h') +
+            _pack_record('SEQUENCE_GOTO_{}'.format(n), int(goto_states[j]),
+                         'h'))
+        for ch, name in element_names.items():
+            file.write(_pack_record(
+                'SEQUENCE_WAVEFORM_NAME_CH_{}_{}'.format(ch, n), name, 's'))
+    return stats
+
+
+class AWGFile:
+    """
+    Reader of AWG5014 .awg sequence files which indexes the records of the
+    file on opening but only reads waveform data when it is asked for (by
+    memory mapping it at its record offset). Both integer and real
+    waveforms can be read.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: path of the .awg file
+        """
+        self.path = path
+        self.settings = {}
+        self.waveforms = {}
+        self.waveform_types = {}
+        self._sequence = {}
+        waveform_names = {}
+        waveform_types = {}
+        waveform_data = {}
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(8)
+                if not header:
+                    break
+                elif len(header) < 8:
+                    raise ValueError('truncated record in {}'.format(path))
+                name_size, data_size = struct.unpack('<II', header)
+                name = f.read(name_size).rstrip(b'\x00').decode('ASCII')
+                if name.startswith('WAVEFORM_DATA_'):
+                    waveform_data[int(name[14:])] = (f.tell(), data_size)
+                    f.seek(data_size, 1)
+                    continue
+                value = self._unpack_value(name, f.read(data_size))
+                if name.startswith('WAVEFORM_NAME_'):
+                    waveform_names[int(name[14:])] = value
+                elif name.startswith('WAVEFORM_TYPE_'):
+                    waveform_types[int(name[14:])] = value
+                elif name.startswith('SEQUENCE_'):
+                    self._add_sequence_record(name, value)
+                elif not name.startswith('WAVEFORM_'):
+                    self.settings[name] = value
+        for number, name in waveform_names.items():
+            offset, data_size = waveform_data[number]
+            kind = waveform_types.get(number, INTEGER)
+            if kind == INTEGER:
+                length = data_size // 2
+            elif kind == REAL:
+                length = data_size // 5
+            else:
+                raise ValueError('waveform {} has unsupported '
+                                 'WAVEFORM_TYPE {}'.format(name, kind))
+            self.waveforms[name] = (offset, length)
+            self.waveform_types[name] = kind
+
+    @staticmethod
+    def _unpack_value(name: str, data: bytes):
+        fmt = _record_format(name)
+        if fmt == 's':
+            return data.rstrip(b'\x00').decode('ASCII')
+        elif fmt is not None:
+            value = struct.unpack('<' + fmt, data)
+            return value[0] if len(value) == 1 else value
+        elif len(data) == 2:
+            return struct.unpack('<h', data)[0]
+        elif len(data) == 8:
+            return struct.unpack('<d', data)[0]
+        return data
+
+    def _add_sequence_record(self, name: str, value):
+        if name.startswith('SEQUENCE_WAVEFORM_NAME_CH_'):
+            ch, n = name[26:].split('_')
+            row = self._sequence.setdefault(int(n), {'waveforms': {}})
+            row['waveforms'][int(ch)] = value
+        else:
+            field, n = name[9:].rsplit('_', 1)
+            row = self._sequence.setdefault(int(n), {'waveforms': {}})
+            row[field.lower()] = value
+
+    def __len__(self):
+        return len(self._sequence)
+
+    @property
+    def channels(self):
+        """
+        Returns:
+            sorted list of channels (1 to 4) used in the sequence
+        """
+        return sorted(set(ch for row in self._sequence.values()
+                          for ch in row['waveforms']))
+
+    def table(self):
+        """
+        Returns:
+            list of (nreps, trig_wait, goto_state, jump_to, {channel: name})
+            for each element of the sequence
+        """
+        return [(row.get('loop', 1), row.get('wait', 0), row.get('goto', 0),
+                 row.get('jump', 0), row['waveforms'])
+                for n, row in sorted(self._sequence.items())]
+
+    def packed(self, name: str):
+        """
+        Args:
+            name: waveform name
+
+        Returns:
+            read only memory map of the packed uint16 waveform
+        """
+        if self.waveform_types[name] != INTEGER:
+            raise ValueError('waveform {} is real, not packed '
+                             'integers'.format(name))
+        offset, length = self.waveforms[name]
+        return np.memmap(self.path, dtype='<u2', mode='r', offset=offset,
+                         shape=(length,))
+
+    def waveform(self, name: str):
+        """
+        Args:
+            name: waveform name
+
+        Returns:
+            wave, m1, m2 (see unpack_waveform and unpack_real_waveform)
+        """
+        if self.waveform_types[name] == REAL:
+            offset, length = self.waveforms[name]
+            return unpack_real_waveform(np.memmap(
+                self.path, dtype=np.uint8, mode='r', offset=offset,
+                shape=(5 * length,)))
+        return unpack_waveform(self.packed(name))
+
+    def to_tuple(self):
+        """
+        Function which unpacks the whole file into the same form as the
+        parse_awg_file function of the QCoDeS Tektronix AWG5014 driver, for
+        use with Sequence.wrap.
+
+        Returns:
+            ((wfms, m1s, m2s, nreps, trig_waits, goto_states, jump_tos,
+              channels), settings)
+        """
+        channels = self.channels
+        wfms = [[] for c in channels]
+        m1s = [[] for c in channels]
+        m2s = [[] for c in channels]
+        nreps, trig_waits, goto_states, jump_tos = [], [], [], []
+        for nrep, trig_wait, goto_state, jump_to, names in self.table():
+            for i, ch in enumerate(channels):
+                wave, m1, m2 = self.waveform(names[ch])
+                wfms[i].append(wave)
+                m1s[i].append(m1)
+                m2s[i].append(m2)
+            nreps.append(nrep)
+            trig_waits.append(trig_wait)
+            goto_states.append(goto_state)
+            jump_tos.append(jump_to)
+        return ((wfms, m1s, m2s, nreps, trig_waits, goto_states, jump_tos,
+                 channels), dict(self.settings))
+
+
+def read_awg_file(path: str):
+    """
+    Args:
+        path: path of the .awg file
+
+    Returns:
+        AWGFile
+    """
+    return AWGFile(path)
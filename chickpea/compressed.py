@@ -0,0 +1,248 @@
+import numpy as np
+
+from .segment import CompositeSegment
+
+# constant runs shorter than this are kept in the dense parts by from_array
+MIN_RUN = 64
+
+
+class CompressedWave:
+    """
+    Read only wave (or marker) stored as a list of runs which are either
+    constant, held as (number of points, value), or dense, held as
+    (number of points, array). Mostly constant waves (eg long flat waits
+    and plateaus) take a tiny fraction of the memory of the dense array,
+    which is only made when it is asked for (to_array, numpy conversion or
+    slicing).
+    """
+
+    def __init__(self, runs=(), dtype=np.float64):
+        """
+        Args:
+            runs: list of (number of points, value or 1d array), adjacent
+                constant runs of the same value are merged
+            dtype: dtype of the dense wave
+        """
+        self.dtype = np.dtype(dtype)
+        self._runs = []
+        for count, value in runs:
+            count = int(count)
+            if count == 0:
+                continue
+            if isinstance(value, np.ndarray):
+                if len(value) != count:
+                    raise ValueError('dense run of {} points given count '
+                                     '{}'.format(len(value), count))
+            else:
+                value = self.dtype.type(value)
+                if (self._runs and
+                        not isinstance(self._runs[-1][1], np.ndarray) and
+                        self._runs[-1][1] == value):
+                    self._runs[-1] = (self._runs[-1][0] + count, value)
+                    continue
+            self._runs.append((count, value))
+        self._offsets = np.zeros(len(self._runs) + 1, dtype=np.int64)
+        np.cumsum([c for c, _ in self._runs], out=self._offsets[1:])
+
+    @classmethod
+    def constant(cls, value, count: int, dtype=np.float64):
+        """
+        Returns:
+            CompressedWave of count points of value
+        """
+        return cls([(count, value)], dtype=dtype)
+
+    @classmethod
+    def from_array(cls, array, min_run: int = MIN_RUN):
+        """
+        Function which compresses a dense array by finding the runs of at
+        least min_run equal points.
+
+        Args:
+            array: 1d array
+            min_run: shortest run to store as constant (default 64)
+
+        Returns:
+            CompressedWave
+        """
+        array = np.asarray(array)
+        n = len(array)
+        if n == 0:
+            return cls(dtype=array.dtype)
+        bounds = np.concatenate(
+            [[0], np.flatnonzero(array[1:] != array[:-1]) + 1, [n]])
+        runs = []
+        pos = 0
+        for i in np.flatnonzero(np.diff(bounds) >= min_run):
+            start, stop = bounds[i], bounds[i + 1]
+            if start > pos:
+                runs.append((start - pos, np.array(array[pos:start])))
+            runs.append((stop - start, array[start]))
+            pos = stop
+        if pos < n:
+            runs.append((n - pos, np.array(array[pos:])))
+        return cls(runs, dtype=array.dtype)
+
+    @classmethod
+    def from_intervals(cls, length: int, starts, stops):
+        """
+        Function which makes a marker of 1s during (possibly overlapping)
+        intervals and 0s elsewhere without painting a dense array.
+
+        Args:
+            length: number of points
+            starts: array of interval start points
+            stops: array of interval stop points (exclusive)
+
+        Returns:
+            uint8 CompressedWave
+        """
+        starts = np.clip(np.asarray(starts, dtype=np.int64), 0, length)
+        stops = np.clip(np.asarray(stops, dtype=np.int64), 0, length)
+        keep = stops > starts
+        order = np.argsort(starts[keep], kind='stable')
+        starts = starts[keep][order]
+        stops = np.maximum.accumulate(stops[keep][order])
+        runs = []
+        pos = 0
+        if len(starts):
+            first = np.flatnonzero(
+                np.concatenate([[True], starts[1:] > stops[:-1]]))
+            last = np.concatenate([first[1:] - 1, [len(starts) - 1]])
+            for start, stop in zip(starts[first], stops[last]):
+                runs.append((start - pos, 0))
+                runs.append((stop - start, 1))
+                pos = stop
+        runs.append((length - pos, 0))
+        return cls(runs, dtype=np.uint8)
+
+    @classmethod
+    def concatenate(cls, waves, dtype=np.float64):
+        """
+        Returns:
+            CompressedWave of the waves (CompressedWaves or arrays) one after
+            another
+        """
+        runs = []
+        for wave in waves:
+            if isinstance(wave, CompressedWave):
+                runs.extend(wave._runs)
+            else:
+                runs.append((len(wave), np.asarray(wave)))
+        return cls(runs, dtype=dtype)
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __repr__(self):
+        return '<CompressedWave: {} points in {} runs, {} bytes>'.format(
+            len(self), len(self._runs), self.nbytes)
+
+    @property
+    def runs(self):
+        """
+        List of (number of points, value or array) runs.
+        """
+        return list(self._runs)
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory used: the dense runs plus 16 bytes per run.
+        """
+        return sum(v.nbytes if isinstance(v, np.ndarray) else 0
+                   for _, v in self._runs) + 16 * len(self._runs)
+
+    @property
+    def dense_nbytes(self):
+        """
+        Memory the dense array would use.
+        """
+        return len(self) * self.dtype.itemsize
+
+    def to_array(self, start: int = 0, stop: int = None):
+        """
+        Function which materializes (part of) the dense wave.
+
+        Args:
+            start: first point (default 0)
+            stop: point after the last (default the end)
+
+        Returns:
+            numpy array
+        """
+        if stop is None:
+            stop = len(self)
+        out = np.empty(max(stop - start, 0), dtype=self.dtype)
+        first = max(int(np.searchsorted(self._offsets, start,
+                                        side='right')) - 1, 0)
+        for i in range(first, len(self._runs)):
+            run_start, run_stop = self._offsets[i], self._offsets[i + 1]
+            if run_start >= stop:
+                break
+            lo = max(start, run_start)
+            hi = min(stop, run_stop)
+            value = self._runs[i][1]
+            if isinstance(value, np.ndarray):
+                out[lo - start:hi - start] = value[lo - run_start:
+                                                   hi - run_start]
+            else:
+                out[lo - start:hi - start] = value
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.to_array()
+        return array if dtype is None else array.astype(dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self.to_array(start, max(start, stop))
+            return self.to_array()[key]
+        index = int(key)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('index {} out of range'.format(key))
+        return self.to_array(index, index + 1)[0]
+
+    def __eq__(self, other):
+        if isinstance(other, CompressedWave):
+            other = other.to_array()
+        return np.array_equal(self.to_array(), other)
+
+    __hash__ = None
+
+
+def segment_runs(segment, min_run: int = MIN_RUN):
+    """
+    Function which gets the runs of a segment, without generating its
+    points if its generator function declares its constant runs (see
+    segment_functions.constant_runs). The runs of a composite segment are
+    those of its children. Explicit points are compressed with
+    from_array and other generated points are kept as they are.
+
+    Args:
+        segment: Segment
+        min_run: shortest run of explicit points to store as constant
+
+    Returns:
+        list of (number of points, value or array)
+    """
+    if isinstance(segment, CompositeSegment):
+        leaves, _, _ = segment._layout()
+        return [run for leaf in leaves for run in segment_runs(leaf, min_run)]
+    runs_func = getattr(segment.func, 'runs', None)
+    if segment._points is not None:
+        return CompressedWave.from_array(segment._points, min_run).runs
+    elif runs_func is not None and 'SR' in segment.func_args:
+        runs = runs_func(**segment.func_args)
+        if sum(c for c, _ in runs) != len(segment):
+            raise RuntimeError('segment {} declared runs of {} points but '
+                               'is {} long'.format(
+                                   segment, sum(c for c, _ in runs),
+                                   len(segment)))
+        return runs
+    points = np.asarray(segment._read_points())
+    return [(len(points), points)]
@@ -1,14 +1,11 @@
 import copy
 import logging
-from typing import List
-import warnings
-
-try:
-    import matplotlib.pyplot as plt
-except RuntimeError as e:
-    warnings.warn('Could not import matplotlib {}'.format(e))
+import numpy as np
+from typing import List, Union
 
 from . import Waveform
+from .validation import validate_element
+from .plotting import pyplot
 
 log = logging.getLogger(__name__)
 
@@ -28,6 +25,7 @@ class Element:
             sample_rate attribute
         """
         self._waveforms = {}
+        self._validated = None
         self.sample_rate = sample_rate
 
     def __getitem__(self, key):
@@ -85,31 +83,96 @@ class Element:
             waveform.channel = channel
         self[waveform.channel] = waveform
 
-    def plot(self, channels: List[int]=None):
+    def plot(self, channels: List[int]=None, max_points: int = None):
         """
         Plots the waves and markers from selected channels
         in a matplotlib.pyplot subplot
 
         Args:
-            subplot to plot on, otherwise makes a new figure
+            channels to plot (default all)
+            max_points: maximum number of points to draw for each channel
+                (see Waveform.plot)
 
         Returns:
             plot
         """
         if channels is None:
             channels = list(self.keys())
+        plt = pyplot()
         try:
             fig = plt.figure()
-        except NameError as e:
+        except Exception as e:
             raise Warning('Could not create matplot figure {}'.format(e))
         plt_count = len(channels)
         for i, chan in enumerate(channels):
             index = (plt_count * 100) + 10 + i + 1
             ax = fig.add_subplot(index)
-            self[chan].plot(subplot=ax)
+            self[chan].plot(subplot=ax, max_points=max_points)
         plt.tight_layout()
         return fig
 
+    def render(self, channels: List[int] = None, out: np.ndarray = None,
+               markers_out: np.ndarray = None):
+        """
+        Function which renders the waves and markers of the channels into
+        one contiguous block each, writing the segments of each channel in
+        place (see Waveform.render_into). The waveforms must all be the
+        same length.
+
+        Args:
+            channels: channels to render in order (default all in
+                ascending order)
+            out: optional float array of shape (channels, points) to write
+                the waves into
+            markers_out: optional uint8 array of shape (channels, 2, points)
+                to write the markers into
+
+        Returns:
+            waves (numpy array of shape (channels, points))
+            markers (numpy array of shape (channels, 2, points))
+        """
+        if channels is None:
+            channels = sorted(self.keys())
+        if not channels:
+            raise RuntimeError('no waveforms in element')
+        lengths = [len(self[c]) for c in channels]
+        if lengths.count(lengths[0]) != len(lengths):
+            raise RuntimeError(
+                'the waveforms of this element are '
+                'not of equal length: {}'.format(str(lengths)))
+        shape = (len(channels), lengths[0])
+        if out is None:
+            out = np.empty(shape)
+        if markers_out is None:
+            markers_out = np.empty((shape[0], 2, shape[1]), dtype=np.uint8)
+        if out.shape != shape or markers_out.shape != (shape[0], 2, shape[1]):
+            raise ValueError('arrays of shape {} and {} given to render '
+                             'element of shape {} into'.format(
+                                 out.shape, markers_out.shape, shape))
+        for i, c in enumerate(channels):
+            self[c].render_into(out[i], markers_out[i])
+        return out, markers_out
+
+    def pack(self, amplitude: Union[float, dict] = 1.0):
+        """
+        Function which packs the waves and markers of all channels into the
+        AWG5014 uint16 format (see awg.pack_waveform).
+
+        Args:
+            amplitude: wave value corresponding to full scale, either one
+                value or a dict of the form {channel: amplitude}
+
+        Returns:
+            dict of form {channel: packed uint16 array}
+            dict of form {channel: number of samples clipped}
+        """
+        packed = {}
+        clipped = {}
+        for ch, waveform in self._waveforms.items():
+            amp = amplitude[ch] if isinstance(amplitude, dict) else amplitude
+            packed[ch], clipped[ch] = waveform.pack(amplitude=amp)
+        return packed, clipped
+
     def print_segment_lists(self, channels: List[int]=None):
         """
         Prints a formatted segment list for each channel of the element
@@ -133,34 +196,35 @@ class Element:
                     print('ch ', c, ': ', template[:-1].format(
                         *self[c].segment_list))
 
+    def _check_key(self):
+        """
+        Returns:
+            key which changes when a waveform is added, removed or mutated
+        """
+        return tuple((ch, w._check_key()) for ch, w in self._waveforms.items())
+
     def check(self):
         """
-        Function which checks:
+        Function which checks (without rendering, see
+        validation.validate_element):
         1) element dictionary is not empty,
         2) runs check on all waveforms
         3) that the lengths of the waveforms are all the same.
         """
-        if not self._waveforms:
-            raise RuntimeError('no waveforms in element')
-        if any(type(k) is not int for k in self._waveforms.keys()):
-            raise RuntimeError('Found non int waveform channel in element '
-                               'dict. Keys: {}'.format(self._waveforms.keys()))
-        for i, waveform in enumerate(self._waveforms.values()):
-            try:
-                waveform.check()
-            except RuntimeError as e:
-                raise RuntimeError(
-                    'error in waveform {}: {}'.format(i, e))
-        lengths = [len(w) for w in self._waveforms.values()]
-        if lengths.count(lengths[0]) != len(lengths):
-            raise RuntimeError(
-                'the waveforms of this element are '
-                'not of equal length: {}'.format(str(lengths)))
-
+        errors = validate_element(self)[0]
+        if errors:
+            raise RuntimeError('; '.join(errors))
         return True
 
     def copy(self):
-        return copy.deepcopy(self)
+        """
+        Returns:
+            copy of the element with each waveform copied (sharing
+            unmutated data, see Waveform.copy)
+        """
+        new = copy.copy(self)
+        new._waveforms = {k: w.copy() for k, w in self._waveforms.items()}
+        return new
 
     def has_key(self, k):
         return k in self._waveforms
@@ -0,0 +1,129 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import pickle
+
+from .segment import CompositeSegment
+from .validation import element_errors
+
+log = logging.getLogger(__name__)
+
+
+def render_element(element):
+    """
+    Function which renders all waveforms of an element.
+
+    Args:
+        element
+
+    Returns:
+        dict of the form {channel: (wave, m1, m2)}
+    """
+    rendered = {}
+    for ch, waveform in element.items():
+        markers = waveform.markers
+        rendered[ch] = (waveform._read_wave(), markers[1], markers[2])
+    return rendered
+
+
+def render_element_compressed(element):
+    """
+    Function which renders all waveforms of an element in compressed form
+    (see Waveform.render_compressed).
+
+    Args:
+        element
+
+    Returns:
+        dict of the form {channel: (wave, m1, m2)} of CompressedWaves
+    """
+    rendered = {}
+    for ch, waveform in element.items():
+        wave, markers = waveform.render_compressed()
+        rendered[ch] = (wave, markers[1], markers[2])
+    return rendered
+
+
+def check_element(element):
+    """
+    Function which validates an element returning the errors rather than
+    raising them so that they can be reported for the right element.
+
+    Args:
+        element
+
+    Returns:
+        list of error messages, empty if the check passed
+    """
+    return element_errors(element)
+
+
+def _picklable(elements):
+    """
+    Function which checks that the segment generator functions used in
+    elements can be pickled (eg are not lambdas or locally defined) so that
+    the elements can be sent to worker processes. Unless workers are forked
+    functions defined in __main__ (eg in a notebook) are also rejected as
+    they pickle but cannot be found by the workers to unpickle them.
+    """
+    funcs = {}
+    for element in elements:
+        for waveform in element.values():
+            for seg in waveform.segment_list or []:
+                if isinstance(seg, CompositeSegment):
+                    for leaf in seg._leaves():
+                        funcs[id(leaf.func)] = leaf.func
+                else:
+                    funcs[id(seg.func)] = seg.func
+    forked = multiprocessing.get_start_method() == 'fork'
+    try:
+        for func in funcs.values():
+            if (not forked and
+                    getattr(func, '__module__', None) == '__main__'):
+                raise pickle.PicklingError(
+                    '{} is defined in __main__'.format(func))
+            pickle.dumps(func)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        log.warning('Cannot render in processes as a segment function '
+                    'cannot be pickled ({}), falling back to '
+                    'threads'.format(e))
+        return False
+    return True
+
+
+def map_elements(func, elements, workers: int, backend: str = 'thread'):
+    """
+    Function which applies func to each element concurrently and returns
+    the results in order. Elements are independent and numpy releases the
+    GIL for the heavy parts of rendering so threads are usually enough,
+    processes avoid the GIL entirely but have to pickle elements and
+    results.
+
+    Args:
+        func: function of one element, must be defined at module level for
+            the process backend
+        elements: list of elements
+        workers: number of worker threads or processes
+        backend: 'thread' or 'process', falls back to 'thread' if the
+            elements use segment functions which cannot be pickled or the
+            worker processes fail to unpickle them
+
+    Returns:
+        list of results
+    """
+    if backend not in ['thread', 'process']:
+        raise ValueError('backend must be \'thread\' or \'process\', '
+                         'received {}'.format(backend))
+    elements = list(elements)
+    if backend == 'process' and _picklable(elements):
+        chunksize = max(1, len(elements) // (4 * workers))
+        try:
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                return list(executor.map(func, elements,
+                                         chunksize=chunksize))
+        except (concurrent.futures.process.BrokenProcessPool,
+                pickle.UnpicklingError, AttributeError, ImportError) as e:
+            log.warning('Rendering in processes failed ({!r}), falling back '
+                        'to threads'.format(e))
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(func, elements))
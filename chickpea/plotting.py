@@ -0,0 +1,101 @@
+import numpy as np
+
+_plt = None
+
+# number of points to draw if the width of the axes can't be found
+DEFAULT_MAX_POINTS = 4000
+
+
+def pyplot():
+    """
+    Function which imports matplotlib.pyplot the first time a plot is made
+    so that importing chickpea does not load matplotlib or a GUI backend.
+
+    Returns:
+        matplotlib.pyplot module
+    """
+    global _plt
+    if _plt is None:
+        try:
+            import matplotlib.pyplot as plt
+        except (ImportError, RuntimeError) as e:
+            raise Warning('Could not import matplotlib {}'.format(e))
+        _plt = plt
+    return _plt
+
+
+def envelope(y: np.ndarray, max_points: int):
+    """
+    Function which decimates an array for plotting by keeping the minimum
+    and maximum of each of max_points / 2 bins (in the order they occur),
+    along with the first and last points. Edges and marker transitions stay
+    visible however many points are dropped.
+
+    Args:
+        y: array to decimate
+        max_points: (approximate) maximum number of points to keep
+
+    Returns:
+        x (indices of the points kept), y (values of the points kept)
+    """
+    y = np.asarray(y)
+    n = len(y)
+    if n <= max(max_points, 2):
+        return np.arange(n), y
+    size = -(-n // max(max_points // 2, 1))
+    full = n // size
+    blocks = y[:full * size].reshape(full, size)
+    starts = np.arange(0, full * size, size)
+    indices = [np.column_stack([blocks.argmin(axis=1) + starts,
+                                blocks.argmax(axis=1) + starts])]
+    if full * size < n:
+        tail = y[full * size:]
+        indices.append(np.array([[tail.argmin(), tail.argmax()]]) +
+                       full * size)
+    indices = np.sort(np.concatenate(indices), axis=1).ravel()
+    indices = np.unique(np.concatenate([[0], indices, [n - 1]]))
+    return indices, y[indices]
+
+
+def _max_points(ax):
+    """
+    Function which finds the number of points worth drawing on an axes,
+    two (a minimum and a maximum) per pixel of its width.
+    """
+    try:
+        width = ax.get_window_extent().width
+    except Exception:
+        return DEFAULT_MAX_POINTS
+    if not width > 0:
+        return DEFAULT_MAX_POINTS
+    return 2 * int(width)
+
+
+def plot_waveform(waveform, ax, max_points: int = None, start: int = 0,
+                  stop: int = None):
+    """
+    Function which plots the wave and markers of a waveform through a
+    min/max envelope (see envelope).
+
+    Args:
+        waveform: Waveform to plot
+        ax: matplotlib axes to plot on
+        max_points: maximum number of points to draw of each of the wave
+            and markers, by default two per pixel of the axes width
+        start: first point to plot (default 0)
+        stop: point after the last to plot (default the end)
+    """
+    if max_points is None:
+        max_points = _max_points(ax)
+    if start == 0 and stop is None:
+        wave, markers = waveform._read_wave(), waveform.markers
+    else:
+        wave, markers = waveform.render(start, stop)
+    for y, style in [(wave,
+                      dict(color='#009FFF', label='wave')),
+                     (markers[1],
+                      dict(color='#008B45', alpha=0.6, label='m1')),
+                     (markers[2],
+                      dict(color='#FE6447', alpha=0.6, label='m2'))]:
+        x, y = envelope(y, max_points)
+        ax.plot(x + start, y, lw=1, **style)
@@ -0,0 +1,172 @@
+import functools
+import threading
+import time
+
+import numpy as np
+
+
+def _nbytes(obj, seen=None):
+    """
+    Function which adds up the size of the numpy arrays in an object
+    (possibly nested in lists, tuples and dicts), counting each array once.
+    """
+    if seen is None:
+        seen = set()
+    if isinstance(obj, np.ndarray):
+        if id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        return obj.nbytes
+    if isinstance(obj, dict):
+        obj = obj.values()
+    elif not isinstance(obj, (list, tuple)):
+        return 0
+    return sum(_nbytes(o, seen) for o in obj)
+
+
+class Profiler:
+    """
+    Counter of the calls, wall time and bytes of numpy arrays returned by
+    each stage of rendering. Returned bytes are not allocations: arrays
+    which are cached or shared (eg points from the points cache) are
+    counted again each time they are returned, and stages which do not
+    return arrays (eg check) count none. Stages are timed inclusively so
+    the time of eg 'unwrap' includes that of the 'wave' and 'markers'
+    renders done during it. Disabled by default, in which case each
+    instrumented call only costs a check of the enabled flag.
+
+    Stages:
+        points.<gen_func name>: generating segment points
+        concatenate: rendering the points of a composite segment
+        wave: assembling a waveform from its segments
+        markers: rasterizing the markers of a waveform
+        copy: copying a waveform
+        check: validating a sequence
+        unwrap, unwrap_packed, unwrap_deduplicated: unwrapping a sequence
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """
+        Clears all counters.
+        """
+        with self._lock:
+            self._stats = {}
+
+    def add(self, stage: str, seconds: float, returned_bytes: int = 0):
+        """
+        Function which records one call of a stage.
+
+        Args:
+            stage: name of the stage
+            seconds: wall time of the call
+            returned_bytes: bytes of numpy arrays returned by the call
+        """
+        with self._lock:
+            counts = self._stats.get(stage)
+            if counts is None:
+                counts = self._stats[stage] = [0, 0., 0]
+            counts[0] += 1
+            counts[1] += seconds
+            counts[2] += returned_bytes
+
+    def call(self, stage: str, func, *args, **kwargs):
+        """
+        Function which calls func recording it as a call of stage.
+
+        Returns:
+            result of func
+        """
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.add(stage, time.perf_counter() - start, _nbytes(result))
+        return result
+
+    def stats(self):
+        """
+        Returns:
+            dict of the form {stage: {'calls': int, 'time': float (s),
+            'returned_bytes': int}}
+        """
+        with self._lock:
+            return {stage: {'calls': c[0], 'time': c[1],
+                            'returned_bytes': c[2]}
+                    for stage, c in self._stats.items()}
+
+    def summary(self):
+        """
+        Returns:
+            table of the stats as a string with the slowest stage first
+        """
+        stats = self.stats()
+        lines = ['{:<32} {:>10} {:>12} {:>12}'.format(
+            'stage', 'calls', 'time (s)', 'returned MB')]
+        for stage, s in sorted(stats.items(), key=lambda i: -i[1]['time']):
+            lines.append('{:<32} {:>10} {:>12.4f} {:>12.2f}'.format(
+                stage, s['calls'], s['time'], s['returned_bytes'] / 2**20))
+        return '\n'.join(lines)
+
+
+profiler = Profiler()
+
+
+def profiled(stage: str):
+    """
+    Decorator which records calls of the decorated function as calls of
+    stage when the profiler is enabled.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            return profiler.call(stage, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable():
+    """
+    Function which turns on recording of render stats (see Profiler).
+    """
+    profiler.enable()
+
+
+def disable():
+    """
+    Function which turns off recording of render stats.
+    """
+    profiler.disable()
+
+
+def reset():
+    """
+    Function which clears the recorded render stats.
+    """
+    profiler.reset()
+
+
+def stats():
+    """
+    Returns:
+        dict of the recorded stats of each stage (see Profiler.stats)
+    """
+    return profiler.stats()
+
+
+def summary():
+    """
+    Returns:
+        table of the recorded stats as a string
+    """
+    return profiler.summary()
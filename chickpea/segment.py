@@ -1,9 +1,150 @@
 import numpy as np
 import copy
+import itertools
 import logging
+import threading
+from collections import OrderedDict
+
+from .segment_functions import batch_evaluate
+from .profiling import profiler
 
 log = logging.getLogger(__name__)
 
+# monotonically increasing stamps used to detect mutation of segment state
+_versions = itertools.count()
+
+
+class FuncArgs(dict):
+    """
+    Dictionary of generator function arguments which records a new version
+    stamp whenever it is mutated so that anything derived from the
+    arguments (eg cached points) can be invalidated.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._version = next(_versions)
+
+    def _touch(self):
+        self._version = next(_versions)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._touch()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._touch()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        super().clear()
+        self._touch()
+
+    def copy(self):
+        """
+        Returns a FuncArgs with the same items and version stamp, as they
+        describe the same points until either of them is mutated.
+        """
+        new = FuncArgs(self)
+        new._version = self._version
+        return new
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._touch()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._touch()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._touch()
+        return value
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._touch()
+
+
+class PointsCache:
+    """
+    Bounded least recently used cache of points generated by segment
+    functions, keyed on the generator function and a frozen copy of its
+    arguments (including SR). Cached arrays are made read only as they
+    are shared between all segments with the same function and arguments.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        """
+        Args:
+            max_bytes: total size of cached arrays above which least
+                recently used entries are evicted
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            try:
+                points = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return points
+
+    def put(self, key, points: np.ndarray):
+        if points.nbytes > self.max_bytes:
+            return
+        points.setflags(write=False)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key).nbytes
+            self._entries[key] = points
+            self.nbytes += points.nbytes
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self._entries.popitem(last=False)[1].nbytes
+
+    def clear(self):
+        """
+        Empties the cache and resets the hit and miss counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        Returns:
+            dict of hits, misses, number of entries, nbytes and max_bytes
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._entries), 'nbytes': self.nbytes,
+                'max_bytes': self.max_bytes}
+
+
+points_cache = PointsCache()
+
 
 class Segment:
     def __init__(self, name=None, gen_func=None, func_args=None,
@@ -19,7 +160,10 @@ class Segment:
         Args:
             name (str): optional segment name
             gen_func(fn): optional function used to generate segment points,
-                must have SR sample rate as a parameter
+                must have SR sample rate as a parameter. If it has a
+                num_points attribute (see segment_functions.num_points)
+                this is used to find the segment length without
+                generating the points
             func_args (dict): optional dict of arguments to go into the
                 function alongside sample rate
             points_array (list or numpy array): optional alternative to have a
@@ -125,18 +269,26 @@ class Segment:
                                'time_markers, points_markers,'
                                ' raw_markers'.format(overlap))
 
+        self._version = next(_versions)
         self.name = name
         self.func = gen_func
         self.func_args = func_args
+        self._points_key_cache = (None, None)
         self._points = points_array
+        self._points_shared = False
+        self._markers_shared = False
         self._points_markers = points_markers
         self._time_markers = time_markers
 
     def __iter__(self):
-        return iter(self.points)
+        return iter(self._read_points())
 
     def __len__(self):
-        return len(self.points)
+        counter = getattr(self.func, 'num_points', None)
+        if (self._points is None and counter is not None and
+                'SR' in self.func_args):
+            return counter(**self.func_args)
+        return len(self._read_points())
 
     def __repr__(self):
         return self.name
@@ -148,59 +300,108 @@ class Segment:
         if not isinstance(other, Segment):
             raise TypeError('Segment can only be added to another Segment.'
                             'Received object of type {}'.format(type(other)))
-
-        new_name = self.name + '_' + other.name
-        new_points = np.concatenate([self.points, other.points])
-        new_markers = {1: {'delay_points': [], 'duration_points': []},
-                       2: {'delay_points': [], 'duration_points': []}}
-
-        if self._time_markers or other._time_markers:
-            log.warning('On segment addition time markers converted to '
-                        'point markers')
-
-        for m in [1, 2]:
-            new_markers[m]['delay_points'].extend(
-                self.markers[m]['delay_points'])
-            for delay_point in other.markers[m]['delay_points']:
-                new_markers[m]['delay_points'].append(
-                    delay_point + len(self))
-            new_markers[m]['duration_points'].extend(
-                self.markers[m]['duration_points'])
-            for duration_point in other.markers[m]['duration_points']:
-                new_markers[m]['duration_points'].append(
-                    duration_point)
-
-        return Segment(name=new_name,
-                       points_array=new_points,
-                       points_markers=new_markers.copy())
+        return CompositeSegment([self, other])
 
     def copy(self):
-        return copy.deepcopy(self)
+        """
+        Function which returns a copy of the segment which shares the
+        points array and marker tables with this one. Whichever of the two
+        is mutated first makes its own private copy of them, so copies are
+        cheap even for large explicit points arrays.
+
+        Returns:
+            Segment
+        """
+        new = copy.copy(self)
+        new._func_args = self._func_args.copy()
+        self._markers_shared = new._markers_shared = True
+        if self._points is not None:
+            self._points_shared = new._points_shared = True
+        return new
+
+    def _own_markers(self):
+        """
+        Function which makes private copies of marker tables shared with
+        other copies of the segment before they are mutated.
+        """
+        if self._markers_shared:
+            self._points_markers = copy.deepcopy(self._points_markers)
+            self._time_markers = copy.deepcopy(self._time_markers)
+            self._markers_shared = False
+
+    def _touch(self):
+        self._version = next(_versions)
+
+    def _get_state(self):
+        """
+        Returns:
+            tuple of version stamps which changes whenever the points or
+            markers of the segment may have changed
+        """
+        return (self._version, self._func_args._version)
+
+    _state = property(fget=_get_state)
+
+    def _set_func(self, gen_func):
+        self._func = gen_func
+        self._touch()
+
+    def _get_func(self):
+        return self._func
+
+    func = property(fget=_get_func, fset=_set_func)
+
+    def _set_func_args(self, func_args):
+        self._func_args = FuncArgs(func_args or {})
+
+    def _get_func_args(self):
+        return self._func_args
+
+    func_args = property(fget=_get_func_args, fset=_set_func_args)
+
+    def _points_key(self):
+        """
+        Function which returns the key of the generated points in the points
+        cache, recalculated only when func or func_args have changed.
+
+        Returns:
+            (gen_func, frozenset of func_args items) or None if the
+            arguments are not hashable
+        """
+        stamp = (self.func, self._func_args._version)
+        if self._points_key_cache[0] != stamp:
+            try:
+                key = (self.func, frozenset(self._func_args.items()))
+                hash(key)
+            except TypeError:
+                key = None
+            self._points_key_cache = (stamp, key)
+        return self._points_key_cache[1]
 
     def _set_points(self, points_array):
         """
         Function which sets the points specifying the segment. The
-        generator function is set to None and any unbound markers with
-        a different length are cleared. Sample rate is also set to None
-        and the function arguments dictionary cleared.
+        generator function is set to None and the function arguments
+        dictionary (including sample rate) cleared.
 
         Args:
             points_array (numpy array): points specifying the segment
         """
         if not isinstance(points_array, np.ndarray):
             raise TypeError('points must be numpy array')
-        for m in [1, 2]:
-            if len(self._unbound_markers[m]) != len(points_array):
-                del self._unbound_markers[m]
         self.func = None
         self.func_args.clear()
         self._points = points_array
+        self._points_shared = False
+        self._touch()
 
-    def _get_points(self):
+    def _read_points(self):
         """
         Function which gets the points of a segment either by returning the
         array if specified or by evaluating the function with the given
-        sample rate.
+        sample rate. Generated points are stored in the points cache and
+        so are shared and read only. Explicit points arrays may be shared
+        with copies of the segment so must not be written to.
 
         Returns:
             points_array (numpy array): points specifying the segment
@@ -213,15 +414,83 @@ class Segment:
         elif 'SR' not in self.func_args:
             raise RuntimeError('sample rate not set so segment points cannot '
                                'be generated by function')
-        else:
-            return self.func(**self.func_args)
+        key = self._points_key()
+        if key is None:
+            return self._generate()
+        points = points_cache.get(key)
+        if points is None:
+            points = self._generate()
+            if isinstance(points, np.ndarray):
+                points_cache.put(key, points)
+        return points
+
+    def _generate(self):
+        """
+        Function which evaluates the generator function, recorded as the
+        'points.<gen_func name>' stage when profiling.
+        """
+        if profiler.enabled:
+            stage = 'points.' + getattr(self.func, '__name__',
+                                        type(self.func).__name__)
+            return profiler.call(stage, self.func, **self.func_args)
+        return self.func(**self.func_args)
+
+    def _get_points(self):
+        """
+        Function which gets the points of a segment. An explicit points
+        array may be edited in place so handing it out marks the segment as
+        changed, which makes anything rendered from it (eg the wave of a
+        waveform) render again when next used. If it is shared with copies
+        of the segment it is copied first. Edits through a reference kept
+        after the waveform has been rendered again are not tracked.
+        Generated points are read only.
+
+        Returns:
+            points_array (numpy array): points specifying the segment
+        """
+        if self._points is not None:
+            if self._points_shared:
+                self._points = np.array(self._points)
+                self._points_shared = False
+            self._touch()
+        return self._read_points()
 
     points = property(fget=_get_points, fset=_set_points)
 
+    def prerender(self, arg: str, values):
+        """
+        Function which generates the points for each of a set of values of
+        one of the func_args in one batched call (see
+        segment_functions.batch_evaluate) and stores them in the points
+        cache, so that copies of the segment with arg set to any of the
+        values do not need to call the generator function.
+
+        Args:
+            arg: name of the func_arg to vary
+            values (list or numpy array): values of arg
+        """
+        if self.func is None:
+            raise RuntimeError('can only prerender segments with a function '
+                               'to generate segment points')
+        elif 'SR' not in self.func_args:
+            raise RuntimeError('sample rate not set so segment points cannot '
+                               'be generated by function')
+        func_args = {k: v for k, v in self.func_args.items() if k != arg}
+        try:
+            keys = [(self.func, frozenset(dict(func_args, **{arg: v}).items()))
+                    for v in values]
+            hash(tuple(keys))
+        except TypeError:
+            return
+        points, lengths = batch_evaluate(self.func, arg, values, **func_args)
+        for key, row, length in zip(keys, points, lengths):
+            if key not in points_cache:
+                points_cache.put(key, np.array(row[:length]))
+
     def _get_duration(self):
         try:
             return len(self) / self.func_args['SR']
-        except TypeError:
+        except (TypeError, KeyError):
             return 0
 
     duration = property(fget=_get_duration)
@@ -231,6 +500,21 @@ class Segment:
         Function which returns a dictionary of marker delays and durations
         specified in points relative to the start of the segment points
 
+        Returns:
+            markers_dict of the form
+                {1: {'delay_points': [], 'duration_points': []},
+                 2: {'delay_points': [], 'duration_points': []}}
+        """
+        return self._bound_markers(self.func_args.get('SR'))
+
+    def _bound_markers(self, sample_rate):
+        """
+        Function which returns the bound markers of the segment in points,
+        converting those specified in time with the sample rate given.
+
+        Args:
+            sample_rate (float): points per second value or None
+
         Returns:
             markers_dict of the form
                 {1: {'delay_points': [], 'duration_points': []},
@@ -238,12 +522,12 @@ class Segment:
         """
         markers_dict = self._points_markers.copy()
         if self._time_markers:
-            if 'SR' not in self.func_args:
+            if sample_rate is None:
                 raise RuntimeError('sample rate not set so bound '
                                    'markers specified in time '
                                    'cannot be calculated in points')
             markers_dict.update(self._time_to_points(self._time_markers,
-                                                     self.func_args['SR']))
+                                                     sample_rate))
         for i in [1, 2]:
             if i not in markers_dict.keys():
                 markers_dict[i] = {'delay_points': [], 'duration_points': []}
@@ -268,6 +552,7 @@ class Segment:
             raise RuntimeError('marker_num be in [1, 2]: '
                                'received {}'.format(marker_num))
 
+        self._own_markers()
         if time:
             try:
                 del self._points_markers[marker_num]
@@ -293,6 +578,7 @@ class Segment:
             except KeyError:
                 self._points_markers[marker_num] = {
                     'delay_points': [delay], 'duration_points': [duration]}
+        self._touch()
 
     def add_raw_marker(self, marker_num, marker_array):
         """
@@ -309,36 +595,49 @@ class Segment:
                                'received {}'.format(marker_num))
         elif not isinstance(marker_array, (list, np.ndarray)):
             raise TypeError('marker_array must be numpy array')
-        elif self._points is None:
-            raise RuntimeError('must set points to set raw_markers')
-        elif len(marker_array) != len(self._points):
+        elif len(marker_array) != self._raw_marker_length():
             raise RuntimeError('marker_array length {} not equal to '
                                'points_array length {}'.format(
                                    len(marker_array),
-                                   len(self._points)))
-        elif any(int(v) not in [0, 1] for v in marker_array):
+                                   self._raw_marker_length()))
+        marker_array = np.asarray(marker_array)
+        if ((marker_array != 0) & (marker_array != 1)).any():
             raise AttributeError('marker values not in [0, 1]')
+        self._own_markers()
         try:
             del self._time_markers[marker_num]
         except KeyError:
             pass
 
-        raw_marker = {marker_num: np.array(marker_array)}
+        raw_marker = {marker_num: marker_array}
         self._points_markers.update(self._raw_to_points(raw_marker))
+        self._touch()
+
+    def _raw_marker_length(self):
+        """
+        Returns:
+            number of points a raw marker array must have
+        """
+        if self._points is None:
+            raise RuntimeError('must set points to set raw_markers')
+        return len(self._points)
 
     def clear_markers(self):
         """
         Function which clears marker dictionaries
         """
-        self._points_markers.clear()
-        self._time_markers.clear()
+        self._points_markers = {}
+        self._time_markers = {}
+        self._markers_shared = False
+        self._touch()
 
     @staticmethod
     def _raw_to_points(raw_markers):
         """
         Function which converts a dictionary of raw marker arrays into
         a dictionary of markers specified in duration and delay of marker
-        'on' state
+        'on' state. Edges are found in one vectorised pass so markers which
+        are on at the first or last point are handled correctly.
 
         Args:
             raw_marker (dict) of the form {1: [], 2: []}
@@ -348,17 +647,14 @@ class Segment:
                 {1: {'delay_points': [], 'duration_points'}...
         """
         points_markers = {}
-        for m in np.array(raw_markers):
-            points_markers[m] = {}
-            nonzero_indices = np.nonzero(raw_markers[m])[0]
-            starts = np.array([int(s) for s in nonzero_indices
-                               if raw_markers[m][s - 1] != 1])
-            ends = np.array([int(s) for s in nonzero_indices
-                             if raw_markers[m][s + 1] != 1])
-            marker_delays = starts
-            marker_durations = ends - starts
-            points_markers[m]['delay_points'] = marker_delays
-            points_markers[m]['duration_points'] = marker_durations
+        for m in raw_markers:
+            on = np.asarray(raw_markers[m]) != 0
+            edges = np.diff(on.view(np.int8), prepend=np.int8(0),
+                            append=np.int8(0))
+            starts = np.flatnonzero(edges == 1)
+            stops = np.flatnonzero(edges == -1)
+            points_markers[m] = {'delay_points': starts.tolist(),
+                                 'duration_points': (stops - starts).tolist()}
         return points_markers
 
     @staticmethod
@@ -386,3 +682,224 @@ class Segment:
             points_markers[m]['delay_points'] = marker_delays
             points_markers[m]['duration_points'] = marker_durations
         return points_markers
+
+
+class CompositeSegment(Segment):
+    def __init__(self, children, name=None):
+        """
+        Segment made of other segments played one after another, as made
+        by adding segments. The children are kept (as a tree when composite
+        segments are added in turn) rather than concatenated, so adding is
+        cheap however long the segments are, generated points still come
+        from the points cache and the func_args of the children can still
+        be changed. Markers of the children are offset when the markers are
+        asked for and the points are rendered into a single array the first
+        time they are read, which is kept until the segment or one of its
+        children changes.
+
+        A sample rate set in the func_args of the composite segment (eg by
+        Waveform.add_segment) is used for all of its children.
+
+        Args:
+            children (list): segments in the order they are played, which
+                are copied (see Segment.copy)
+            name (str): optional segment name, by default the names of
+                the children joined by '_'
+        """
+        if not children:
+            raise ValueError('composite segment must have at least one child')
+        if not all(isinstance(c, Segment) for c in children):
+            raise TypeError('children of a composite segment must be of '
+                            'type Segment')
+        rates = set(c.func_args['SR'] for c in children
+                    if 'SR' in c.func_args)
+        if len(rates) > 1:
+            raise RuntimeError('Cannot combine segments with different SR in '
+                               'func_args: {}'.format(sorted(rates)))
+        if name is None:
+            name = '_'.join(str(c.name) for c in children)
+        super().__init__(name=name,
+                         func_args={'SR': rates.pop()} if rates else None)
+        self._children = tuple(c.copy() for c in children)
+        self._children_shared = False
+        self._layout_cache = (None, None)
+        self._rendered = (None, None)
+
+    def __len__(self):
+        return int(self._layout()[1][-1])
+
+    def copy(self):
+        """
+        Function which returns a copy of the composite segment which shares
+        its children (and rendered points) with this one until either
+        of them has its children edited.
+
+        Returns:
+            CompositeSegment
+        """
+        new = super().copy()
+        self._children_shared = new._children_shared = True
+        return new
+
+    def _get_children(self):
+        """
+        Function which gets the child segments, which can be edited (eg
+        to change their func_args). Children shared with copies of the
+        segment are copied first.
+
+        Returns:
+            tuple of segments
+        """
+        if self._children_shared:
+            self._children = tuple(c.copy() for c in self._children)
+            self._children_shared = False
+        return self._children
+
+    children = property(fget=_get_children)
+
+    def _walk(self):
+        """
+        Function which lists the segments of the tree in the order they are
+        played, each composite segment before its children. This is done
+        without recursion so long chains of additions are fine.
+
+        Returns:
+            list of (segment, sample rate or None) where the sample rate is
+            that of the outermost composite segment which has one
+        """
+        nodes = []
+        stack = [(self, None)]
+        while stack:
+            node, rate = stack.pop()
+            if rate is None:
+                rate = node.func_args.get('SR')
+            nodes.append((node, rate))
+            if isinstance(node, CompositeSegment):
+                stack.extend((c, rate) for c in reversed(node._children))
+        return nodes
+
+    def _leaves(self):
+        """
+        Returns:
+            list of the (non composite) segments played, in order
+        """
+        return [node for node, _ in self._walk()
+                if not isinstance(node, CompositeSegment)]
+
+    def _get_state(self):
+        """
+        Returns:
+            tuple of the version stamps of the segment and all of its
+            children
+        """
+        return tuple(Segment._get_state(node) for node, _ in self._walk())
+
+    _state = property(fget=_get_state)
+
+    def _layout(self):
+        """
+        Function which finds the segments played (with the sample rate of
+        the composite segment set in their func_args) and where each of
+        them starts, cached until the segment or any of its children
+        changes.
+
+        Returns:
+            (list of segments, int64 numpy array of the start point of each
+            followed by the total length, list of (segment, sample rate,
+            start point) of all segments in the tree)
+        """
+        nodes = self._walk()
+        state = tuple(Segment._get_state(node) for node, _ in nodes)
+        if self._layout_cache[0] == state:
+            return self._layout_cache[1]
+        leaves = []
+        offsets = [0]
+        starts = []
+        for node, rate in nodes:
+            starts.append((node, rate, offsets[-1]))
+            if isinstance(node, CompositeSegment):
+                continue
+            if rate is not None and node.func_args.get('SR') != rate:
+                node = node.copy()
+                node.func_args['SR'] = rate
+            leaves.append(node)
+            offsets.append(offsets[-1] + len(node))
+        layout = (leaves, np.array(offsets, dtype=np.int64), starts)
+        self._layout_cache = (state, layout)
+        return layout
+
+    def _get_markers(self):
+        """
+        Function which returns the bound markers of the composite segment
+        and of its children (offset by where they start) in points.
+
+        Returns:
+            markers_dict of the form
+                {1: {'delay_points': [], 'duration_points': []},
+                 2: {'delay_points': [], 'duration_points': []}}
+        """
+        markers = {m: {'delay_points': [], 'duration_points': []}
+                   for m in [1, 2]}
+        for node, rate, start in self._layout()[2]:
+            node_markers = node._bound_markers(rate)
+            for m in [1, 2]:
+                markers[m]['delay_points'].extend(
+                    d + start for d in node_markers[m]['delay_points'])
+                markers[m]['duration_points'].extend(
+                    node_markers[m]['duration_points'])
+        return markers
+
+    markers = property(fget=_get_markers)
+
+    def _read_points(self):
+        """
+        Function which gets the points of the composite segment, rendering
+        the children into one array if they have changed since it was
+        last made. The array is read only as it may be shared with copies,
+        edit the children instead.
+
+        Returns:
+            points_array (numpy array): points specifying the segment
+        """
+        layout = self._layout()
+        if self._rendered[0] is not layout:
+            if profiler.enabled:
+                points = profiler.call('concatenate', self._concatenate,
+                                       *layout[:2])
+            else:
+                points = self._concatenate(*layout[:2])
+            points.setflags(write=False)
+            self._rendered = (layout, points)
+        return self._rendered[1]
+
+    @staticmethod
+    def _concatenate(leaves, offsets):
+        """
+        Function which writes the points of each segment into one array.
+
+        Args:
+            leaves: list of segments
+            offsets: start point of each segment followed by the total
+                length
+
+        Returns:
+            points_array (numpy array)
+        """
+        points = np.empty(offsets[-1])
+        for leaf, start, stop in zip(leaves, offsets[:-1], offsets[1:]):
+            leaf_points = leaf._read_points()
+            if len(leaf_points) != stop - start:
+                raise RuntimeError('segment {} generated {} points but '
+                                   'declared {}'.format(
+                                       leaf, len(leaf_points), stop - start))
+            points[start:stop] = leaf_points
+        return points
+
+    def _set_points(self, points_array):
+        raise RuntimeError('Cannot set the points of a composite segment, '
+                           'set those of its children instead')
+
+    points = property(fget=Segment._get_points, fset=_set_points)
+
+    def _raw_marker_length(self):
+        return len(self)
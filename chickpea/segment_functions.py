@@ -1,18 +1,208 @@
 import numpy as np
 
 
+def num_points(counter):
+    """
+    Decorator which declares a cheap function for calculating the number
+    of points a segment generator function will return, so that segment
+    lengths and durations can be found without generating the points.
+
+    Args:
+        counter (fn): function which takes the same arguments as the
+            generator function (including SR) and returns an int
+
+    eg
+        @num_points(lambda dur, SR, **kwargs: int(round(SR * dur)))
+        def my_func(dur, SR):
+            ...
+    """
+    def decorator(func):
+        func.num_points = counter
+        return func
+    return decorator
+
+
+def batched(batch_func):
+    """
+    Decorator which declares a vectorised version of a segment generator
+    function for use by batch_evaluate. It is called with the same
+    arguments as the generator function but where any of them may be a 1d
+    array (of the same length) and returns (points, lengths) as
+    batch_evaluate does.
+
+    Args:
+        batch_func (fn): vectorised generator function
+    """
+    def decorator(func):
+        func.batch = batch_func
+        return func
+    return decorator
+
+
+def constant_runs(runs_func):
+    """
+    Decorator which declares that a segment generator function returns
+    points made of constant runs, so that segments using it can be held in
+    compressed form (see compressed.CompressedWave) without generating
+    the points.
+
+    Args:
+        runs_func (fn): function which takes the same arguments as the
+            generator function (including SR) and returns a list of
+            (number of points, value) in order
+    """
+    def decorator(func):
+        func.runs = runs_func
+        return func
+    return decorator
+
+
+def batch_evaluate(gen_func, arg, values, **func_args):
+    """
+    Function which evaluates a segment generator function for each of a
+    1d array of values of one of its arguments in one broadcasted
+    computation if the function declares a batch version (see batched),
+    otherwise by calling it for each value.
+
+    Args:
+        gen_func (fn): segment generator function
+        arg (str): name of argument to vary
+        values (list or numpy array): values of the argument
+        func_args: all other arguments of gen_func (including SR)
+
+    Returns:
+        points (numpy array) of shape (len(values), max(lengths)) where
+            row i holds the points for values[i] padded with zeros
+        lengths (numpy array) of the number of points in each row
+    """
+    values = np.asarray(values)
+    batch = getattr(gen_func, 'batch', None)
+    if batch is not None:
+        func_args[arg] = values
+        return batch(**func_args)
+    rows = []
+    for val in values:
+        func_args[arg] = val
+        rows.append(np.asarray(gen_func(**func_args)))
+    lengths = np.array([len(r) for r in rows], dtype=int)
+    points = np.zeros((len(rows), lengths.max(initial=0)))
+    for i, r in enumerate(rows):
+        points[i, :len(r)] = r
+    return points, lengths
+
+
+def _columns(*args):
+    """
+    Function which broadcasts arguments against each other as column
+    vectors so that each row of a batch uses one value of each.
+    """
+    return [a.reshape(-1, 1) for a in
+            np.broadcast_arrays(*[np.atleast_1d(np.asarray(a, dtype=float))
+                                  for a in args])]
+
+
+def _pad_mask(lengths):
+    lengths = np.rint(lengths).astype(int).ravel()
+    if (lengths < 0).any():
+        raise ValueError('Number of samples must be non-negative')
+    index = np.arange(lengths.max(initial=0), dtype=float)
+    return lengths, index, index < lengths.reshape(-1, 1)
+
+
+def _linspace_rows(start, stop, lengths, index):
+    """
+    Function which evaluates np.linspace(start, stop, num=length) for each
+    row (with the same arithmetic as numpy) as far as that row's length.
+    """
+    div = np.maximum(lengths.reshape(-1, 1) - 1, 1)
+    rows = index * ((stop - start) / div) + start
+    last = lengths - 1
+    has_last = last > 0
+    rows[np.flatnonzero(has_last), last[has_last]] = np.broadcast_to(
+        stop, (len(lengths), 1))[has_last, 0]
+    return rows
+
+
+def _ramp_batch(start, stop, dur, SR):
+    start, stop, dur, SR = _columns(start, stop, dur, SR)
+    lengths, index, mask = _pad_mask(SR * dur)
+    points = _linspace_rows(start, stop, lengths, index)
+    points[~mask] = 0
+    return points, lengths
+
+
+def _flat_batch(amp, dur, SR):
+    amp, dur, SR = _columns(amp, dur, SR)
+    lengths, index, mask = _pad_mask(SR * dur)
+    return amp * mask, lengths
+
+
+def _gaussian_t(sigma, sigma_cutoff, SR):
+    lengths, index, mask = _pad_mask(SR * 2 * sigma_cutoff * sigma)
+    t = _linspace_rows(-1 * sigma_cutoff * sigma, sigma_cutoff * sigma,
+                       lengths, index)
+    return t, lengths, mask
+
+
+def _gaussian_batch(sigma, sigma_cutoff, amp, SR):
+    sigma, sigma_cutoff, amp, SR = _columns(sigma, sigma_cutoff, amp, SR)
+    t, lengths, mask = _gaussian_t(sigma, sigma_cutoff, SR)
+    points = amp * np.exp(-(t**2 / (2 * sigma**2)))
+    points[~mask] = 0
+    return points, lengths
+
+
+def _gaussian_derivative_batch(sigma, sigma_cutoff, amp, SR):
+    sigma, sigma_cutoff, amp, SR = _columns(sigma, sigma_cutoff, amp, SR)
+    t, lengths, mask = _gaussian_t(sigma, sigma_cutoff, SR)
+    points = -amp * t / sigma * np.exp(-(t / (2 * sigma))**2)
+    points[~mask] = 0
+    return points, lengths
+
+
+def _dur_points(dur, SR, **kwargs):
+    return int(round(SR * dur))
+
+
+def _gaussian_points(sigma, sigma_cutoff, SR, **kwargs):
+    return int(round(SR * 2 * sigma_cutoff * sigma))
+
+
+def _stairs_points(start, stop, step, dur, SR, **kwargs):
+    step_num = int(round((stop - start) / step + 1))
+    step_points = int(round(SR * (dur / step_num)))
+    return step_num * step_points
+
+
+def _flat_runs(amp, dur, SR, **kwargs):
+    return [(_dur_points(dur, SR), amp)]
+
+
+def _stairs_runs(start, stop, step, dur, SR, **kwargs):
+    step_num = int(round((stop - start) / step + 1))
+    step_points = int(round(SR * (dur / step_num)))
+    return [(step_points, val)
+            for val in np.linspace(start, stop, num=step_num)]
+
+
+@batched(_ramp_batch)
+@num_points(_dur_points)
 def ramp(start, stop, dur, SR):
-    points = int(round(SR * dur))
+    points = _dur_points(dur, SR)
     return np.linspace(start, stop, points)
 
 
+@batched(_gaussian_batch)
+@num_points(_gaussian_points)
 def gaussian(sigma, sigma_cutoff, amp, SR):
-    points = int(round(SR * 2 * sigma_cutoff * sigma))
+    points = _gaussian_points(sigma, sigma_cutoff, SR)
     t = np.linspace(-1 * sigma_cutoff * sigma, sigma_cutoff * sigma,
                     num=points)
     return amp * np.exp(-(t**2 / (2 * sigma**2)))
 
 
+@constant_runs(_stairs_runs)
+@num_points(_stairs_points)
 def stairs(start, stop, step, dur, SR):
     step_num = int(round((stop - start) / step + 1))
     step_dur = dur / step_num
@@ -21,13 +211,18 @@ def stairs(start, stop, step, dur, SR):
     return np.hstack([np.ones(step_points) * val for val in step_values])
 
 
+@constant_runs(_flat_runs)
+@batched(_flat_batch)
+@num_points(_dur_points)
 def flat(amp, dur, SR):
-    points = int(round(SR * dur))
+    points = _dur_points(dur, SR)
     return amp * np.ones(points)
 
 
+@batched(_gaussian_derivative_batch)
+@num_points(_gaussian_points)
 def gaussian_derivative(sigma, sigma_cutoff, amp, SR):
-    points = int(round(SR * 2 * sigma_cutoff * sigma))
+    points = _gaussian_points(sigma, sigma_cutoff, SR)
     t = np.linspace(-1 * sigma_cutoff * sigma, sigma_cutoff * sigma,
                     num=points)
     return -amp * t / sigma * np.exp(-(t / (2 * sigma))**2)
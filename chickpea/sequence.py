@@ -1,11 +1,19 @@
 import numpy as np
 import copy
+import logging
 import os
+from collections import OrderedDict
 from typing import Union, List, Tuple
 from . import Segment, Waveform, Element
+from .parallel import (map_elements, render_element,
+                       render_element_compressed, check_element)
+from .store import save_sequence, load_sequence
+from .awg import write_awg_file, read_awg_file
+from .validation import validate_element, validate_sequence
+from . import profiling
+from .profiling import profiled
 
-# TODO: write tests (for all)
-# TODO: test wrap
+log = logging.getLogger(__name__)
 
 setting_options = Union[int, List[int], np.ndarray]
 
@@ -64,6 +72,7 @@ class Sequence:
         self._start = start
         self._stop = stop
         self._step = step
+        self.variable_arrays = None
         self.sample_rate = sample_rate
 
     def __getitem__(self, key: int):
@@ -115,6 +124,8 @@ class Sequence:
 
     @property
     def variable_array(self):
+        if self.variable_arrays is not None:
+            return self.variable_arrays[0]
         if any(s is None for s in [self._start, self._stop, self._step]):
             return None
         else:
@@ -129,6 +140,10 @@ class Sequence:
         """
         Function which adds an Element to the elements list
 
+        The element is validated as it is added (see
+        validation.validate_element) so that check only has to revalidate
+        elements which have been mutated since.
+
         Args:
             Element
             position to insert element in list (default at end)
@@ -145,6 +160,151 @@ class Sequence:
             self._elements.insert(position, element)
         else:
             self._elements.append(element)
+        validate_element(element)
+
+    @classmethod
+    def sweep(cls, template: Element, axes: List[tuple],
+              zipped: bool = False, total_duration: float = None,
+              prerender: bool = False, lazy: bool = False, **kwargs):
+        """
+        Function which builds a sequence by varying func_args of segments
+        of a template element. Channels with no axis are shared (not
+        copied) between all elements as are waveforms which do not change
+        between elements, and varied waveforms are copies of the template
+        sharing all unchanged segments, so copy a waveform before mutating
+        it in only one element.
+
+        Args:
+            template: element with segment list waveforms on the varied
+                channels
+            axes: list of tuples of the form
+                (channel, segment index, func_arg, values) or
+                (channel, segment index, func_arg, values, compensate index)
+                where the 'dur' of the segment at compensate index is set
+                so that the channel keeps the same length
+            zipped: if True all axes are varied together (and must have
+                the same length), otherwise the sequence is the outer
+                product of the axes with the first axis varying slowest
+            total_duration: optional duration to compensate channels to,
+                by default the duration of the template channel
+            prerender: if True the points of each segment varied by only
+                one axis are generated for all values of the axis in one
+                batched call (see Segment.prerender)
+            lazy: if True a LazySequence is returned which builds elements
+                only when they are used
+            kwargs: passed on to Sequence (eg name, variable_unit)
+
+        Returns:
+            Sequence (or LazySequence) with variable_arrays set to the value
+            of each axis for each element
+        """
+        axes = [tuple(a) + (None,) * (5 - len(a)) for a in axes]
+        if not axes:
+            raise ValueError('at least one axis must be given')
+        for ch, seg, arg, values, comp in axes:
+            if ch not in template:
+                raise ValueError('channel {} not in template'.format(ch))
+            segment_list = template[ch].segment_list
+            if segment_list is None:
+                raise ValueError('channel {} of template is not made of a '
+                                 'segment list'.format(ch))
+            for i in [seg, comp]:
+                if i is not None and not -len(segment_list) <= i < len(
+                        segment_list):
+                    raise IndexError('segment index {} out of range for '
+                                     'channel {}'.format(i, ch))
+        value_arrays = [np.asarray(a[3]) for a in axes]
+        if zipped:
+            if any(len(v) != len(value_arrays[0]) for v in value_arrays):
+                raise ValueError('zipped axes must all have the same length')
+            indices = np.tile(np.arange(len(value_arrays[0])),
+                              (len(axes), 1))
+        else:
+            grids = np.meshgrid(*[np.arange(len(v)) for v in value_arrays],
+                                indexing='ij')
+            indices = np.array([g.ravel() for g in grids])
+
+        if prerender:
+            varied = [(a[0], a[1] % len(template[a[0]].segment_list))
+                      for a in axes]
+            for (ch, seg, arg, values, comp), v, s in zip(
+                    axes, value_arrays, varied):
+                if varied.count(s) == 1:
+                    template[ch].segment_list[seg].prerender(
+                        arg, np.unique(v))
+
+        targets = {}
+        for ch, seg, arg, values, comp in axes:
+            if comp is not None:
+                if total_duration is None:
+                    try:
+                        targets[ch, comp] = len(template[ch])
+                    except Exception as e:
+                        raise ValueError(
+                            'could not get length of template channel {} '
+                            'to compensate to, set total_duration: '
+                            '{}'.format(ch, e))
+                else:
+                    comp_seg = template[ch].segment_list[comp]
+                    targets[ch, comp] = int(round(
+                        total_duration * comp_seg.func_args['SR']))
+        channel_axes = {ch: [j for j, a in enumerate(axes) if a[0] == ch]
+                        for ch in template.keys()}
+        waveforms = {ch: {} for ch in template.keys()}
+
+        def make_element(n):
+            element = Element()
+            element._sample_rate = template.sample_rate
+            for ch in template.keys():
+                key = tuple(indices[j, n] for j in channel_axes[ch])
+                waveform = waveforms[ch].get(key)
+                if waveform is None:
+                    waveform = cls._sweep_waveform(
+                        template[ch], [axes[j] for j in channel_axes[ch]],
+                        [value_arrays[j][indices[j, n]]
+                         for j in channel_axes[ch]], targets)
+                    if not lazy:
+                        waveforms[ch][key] = waveform
+                element[ch] = waveform
+            return element
+
+        kwargs.setdefault('variable', '_'.join(a[2] for a in axes))
+        if lazy:
+            sequence = LazySequence(indices.shape[1], make_element, **kwargs)
+        else:
+            sequence = cls(**kwargs)
+            for n in range(indices.shape[1]):
+                sequence.add_element(make_element(n))
+        sequence.variable_arrays = [v[i] for v, i in
+                                    zip(value_arrays, indices)]
+        return sequence
+
+    @staticmethod
+    def _sweep_waveform(template: Waveform, axes: List[tuple],
+                        values: list, targets: dict):
+        """
+        Function which makes a copy of a template waveform with the func_args
+        given by the axes set to values and compensating segments set to
+        reach their target number of points.
+        """
+        if not axes:
+            return template
+        waveform = template.copy()
+        for (ch, seg, arg, _, comp), val in zip(axes, values):
+            waveform.segment_list[seg].func_args[arg] = val
+        for ch, seg, arg, _, comp in axes:
+            if comp is None:
+                continue
+            comp_seg = waveform.segment_list[comp]
+            other_points = sum(len(s) for s in waveform.segment_list
+                               if s is not comp_seg)
+            comp_points = targets[ch, comp] - other_points
+            if comp_points < 0:
+                raise ValueError('cannot compensate channel {}: other '
+                                 'segments are {} points longer than the '
+                                 'total'.format(ch, -comp_points))
+            comp_seg.func_args['dur'] = comp_points / comp_seg.func_args['SR']
+        return waveform
 
     def clear(self):
         """
@@ -152,16 +312,17 @@ class Sequence:
         sets stored values to None
         """
         del self._elements[:]
-        del self.trig_waits[:]
-        del self.nreps[:]
-        del self.goto_states[:]
-        del self.jump_tos[:]
+        for lst in [self.trig_waits, self.nreps, self.goto_states,
+                    self.jump_tos]:
+            if isinstance(lst, list):
+                del lst[:]
         self.name = None
         self.variable = None
         self.variable_unit = None
         self._start = None
         self._stop = None
         self._step = None
+        self.variable_arrays = None
 
     def _get_channels_used(self, element_index=0):
         """
@@ -176,12 +337,85 @@ class Sequence:
         chans = list(self._elements[element_index].keys())
         return chans
 
-    def unwrap(self):
+    @profiled('render')
+    def render(self, path: str = None, channels: List[int] = None):
+        """
+        Function which renders the whole sequence into one
+        (elements, channels, points) array of waves and one
+        (elements, channels, 2, points) uint8 array of markers, writing
+        each element in place (see Element.render). All elements must use
+        the channels and be the same length.
+
+        Args:
+            path: optional directory in which to create the arrays as
+                memory mapped waves.npy and markers.npy files (eg for
+                sequences bigger than memory), otherwise they are in memory
+            channels: channels to render in order (default all channels of
+                the first element in ascending order)
+
+        Returns:
+            waves, markers (numpy arrays or memmaps)
+        """
+        if not len(self._elements):
+            raise RuntimeError('no elements in sequence')
+        if channels is None:
+            channels = sorted(self._elements[0].keys())
+        lengths = set()
+        for j, element in enumerate(self._elements):
+            if any(c not in element for c in channels):
+                raise ValueError('element {} does not have all of the '
+                                 'channels {}'.format(j, channels))
+            lengths.update(len(element[c]) for c in channels)
+        if len(lengths) != 1:
+            raise ValueError('all elements must be the same length to be '
+                             'rendered together, found lengths {}'.format(
+                                 sorted(lengths)))
+        shape = (len(self._elements), len(channels), lengths.pop())
+        markers_shape = shape[:2] + (2,) + shape[2:]
+        if path is None:
+            waves = np.empty(shape)
+            markers = np.empty(markers_shape, dtype=np.uint8)
+        else:
+            os.makedirs(path, exist_ok=True)
+            waves = np.lib.format.open_memmap(
+                os.path.join(path, 'waves.npy'), mode='w+',
+                dtype=np.float64, shape=shape)
+            markers = np.lib.format.open_memmap(
+                os.path.join(path, 'markers.npy'), mode='w+',
+                dtype=np.uint8, shape=markers_shape)
+        for j, element in enumerate(self._elements):
+            element.render(channels, out=waves[j], markers_out=markers[j])
+        if path is not None:
+            waves.flush()
+            markers.flush()
+        return waves, markers
+
+    @profiled('unwrap')
+    def unwrap(self, workers: int = None, backend: str = 'thread',
+               compressed: bool = False, contiguous: bool = False,
+               path: str = None):
         """
         Function which unwraps the sequence into a tuple of lists which
         are the inputs for the Tektronix_AWG5014 qcodes instument_driver
         make_send_and_load_awg_file function.
 
+        Args:
+            - workers: optional number of threads or processes to render
+               elements in parallel with, by default elements are rendered
+               one after another
+            - backend: 'thread' (default) or 'process', see
+               parallel.map_elements
+            - compressed: if True the waves and markers are
+               compressed.CompressedWaves rather than arrays (see
+               Waveform.render_compressed), np.asarray makes the dense
+               array of any one of them
+            - contiguous: if True the sequence is rendered into one block
+               (see render) and the waves and markers are views into it,
+               all elements must be the same length, cannot be used with
+               workers or compressed
+            - path: optional directory to memory map the block in, only
+               when contiguous
+
         Returns:
             - tuple of (waves, m1s, m2s, nreps, trig_waits,
                goto_states, jump_tos, channels)
@@ -194,29 +428,323 @@ class Sequence:
 
                all others are arrays of the same length as the sequence
         """
-        chan_list = self._get_channels_used()
-        awg_ch_dict = {}
+        if contiguous:
+            if workers is not None or compressed:
+                raise ValueError('workers and compressed cannot be used '
+                                 'with contiguous')
+            return self._unwrap_contiguous(path)
+        elif path is not None:
+            raise ValueError('path can only be used with contiguous')
+        awg_ch_dict = self._get_awg_channels()
         wf_dict = {}
         m1_dict = {}
         m2_dict = {}
-        for chan in chan_list:
-            awg, channel = divmod(chan-1, 4)
-            channel += 1
-            if awg not in awg_ch_dict:
-                awg_ch_dict[awg] = []
-            awg_ch_dict[awg].append(channel)
         for awg, ch_list in awg_ch_dict.items():
-            chan_list.sort()
             wf_dict[awg] = [[] for c in ch_list]
             m1_dict[awg] = [[] for c in ch_list]
             m2_dict[awg] = [[] for c in ch_list]
 
-        for element in self._elements:
+        render = render_element_compressed if compressed else render_element
+        if workers is None:
+            rendered_elements = map(render, self._elements)
+        else:
+            rendered_elements = map_elements(render, self._elements,
+                                             workers, backend)
+        for rendered in rendered_elements:
             for awg, ch_list in awg_ch_dict.items():
                 for i, ch in enumerate(ch_list):
-                    wf_dict[awg][i].append(element[ch].wave)
-                    m1_dict[awg][i].append(element[ch].markers[1])
-                    m2_dict[awg][i].append(element[ch].markers[2])
+                    wave, m1, m2 = rendered[awg * 4 + ch]
+                    wf_dict[awg][i].append(wave)
+                    m1_dict[awg][i].append(m1)
+                    m2_dict[awg][i].append(m2)
+        seq_lists = self._get_sequencing_lists()
+        unwrapped_tuples = []
+        for awg in awg_ch_dict:
+            ch_list = awg_ch_dict[awg]
+            unwrapped_tuples.append(
+                (wf_dict[awg], m1_dict[awg], m2_dict[awg]) + seq_lists +
+                (ch_list,))
+        return unwrapped_tuples
+
+    def _unwrap_contiguous(self, path: str = None):
+        """
+        Function which unwraps the sequence like unwrap but with the waves
+        and markers as views into the block made by render.
+        """
+        awg_ch_dict = self._get_awg_channels()
+        channels = [awg * 4 + ch for awg in awg_ch_dict
+                    for ch in awg_ch_dict[awg]]
+        waves, markers = self.render(path=path, channels=channels)
+        seq_lists = self._get_sequencing_lists()
+        unwrapped_tuples = []
+        i = 0
+        for awg, ch_list in awg_ch_dict.items():
+            rows = range(i, i + len(ch_list))
+            i += len(ch_list)
+            unwrapped_tuples.append(
+                ([list(waves[:, r]) for r in rows],
+                 [list(markers[:, r, 0]) for r in rows],
+                 [list(markers[:, r, 1]) for r in rows]) + seq_lists +
+                (ch_list,))
+        return unwrapped_tuples
+
+    @profiled('unwrap_packed')
+    def unwrap_packed(self, amplitude: Union[float, dict] = 1.0):
+        """
+        Function which unwraps the sequence like unwrap but with each wave
+        and its markers packed into one AWG5014 uint16 array (see
+        awg.pack_waveform), releasing the float wave once packed.
+
+        Args:
+            - amplitude: wave value corresponding to full scale, either one
+               value or a dict of the form {channel: amplitude}
+
+        Returns:
+            - list of tuples (one per awg) of (packed, nreps, trig_waits,
+               goto_states, jump_tos, channels)
+
+               packed is of the form
+               [[wfm1ch1, wfm2ch1, ...], [wfm1ch2, wfm2ch2], ...]
+
+               all others are as for unwrap
+            - dict of stats: samples, clipped (number of samples clipped)
+               and clipped_waveforms (list of (element index, channel)
+               tuples which had samples clipped)
+        """
+        awg_ch_dict = self._get_awg_channels()
+        packed = {awg: [[] for c in ch_list]
+                  for awg, ch_list in awg_ch_dict.items()}
+        stats = {'samples': 0, 'clipped': 0, 'clipped_waveforms': []}
+        for j, element in enumerate(self._elements):
+            for awg, ch_list in awg_ch_dict.items():
+                for i, ch in enumerate(ch_list):
+                    chan = awg * 4 + ch
+                    waveform = element[chan]
+                    amp = (amplitude[chan] if isinstance(amplitude, dict)
+                           else amplitude)
+                    was_rendered = waveform._is_rendered()
+                    wfm, clipped = waveform.pack(amplitude=amp)
+                    if not was_rendered:
+                        waveform._release()
+                    packed[awg][i].append(wfm)
+                    stats['samples'] += len(wfm)
+                    if clipped:
+                        stats['clipped'] += clipped
+                        stats['clipped_waveforms'].append((j, chan))
+        seq_lists = self._get_sequencing_lists()
+        unwrapped_tuples = []
+        for awg, ch_list in awg_ch_dict.items():
+            unwrapped_tuples.append((packed[awg],) + seq_lists + (ch_list,))
+        return unwrapped_tuples, stats
+
+    def iter_unwrap(self, release: bool = True):
+        """
+        Generator which renders the sequence one element at a time so that
+        it can be consumed (eg written to file or uploaded) without holding
+        the whole rendered sequence in memory.
+
+        Args:
+            release: if True rendered arrays cached on waveforms during
+                the iteration are dropped once the last element using the
+                waveform has been consumed, so waveforms shared by several
+                elements are only rendered once (default True)
+
+        Yields:
+            - tuple of (element index, waveforms, sequencing row)
+
+               waveforms is a dict of the form {channel: (wave, m1, m2)}
+
+               sequencing row is a tuple of (nrep, trig_wait, goto_state,
+               jump_to)
+        """
+        seq_lists = self._get_sequencing_lists()
+        # index of the last element using each waveform, elements made on
+        # demand (see LazySequence) do not share waveforms
+        last = {}
+        if release and isinstance(self._elements, list):
+            for j, element in enumerate(self._elements):
+                for waveform in element.values():
+                    last[id(waveform)] = j
+        to_release = {}
+        try:
+            for j, element in enumerate(self._elements):
+                rendered = {}
+                for ch, waveform in element.items():
+                    if (release and id(waveform) not in to_release and
+                            not waveform._is_rendered()):
+                        to_release[id(waveform)] = waveform
+                    markers = waveform.markers
+                    rendered[ch] = (waveform._read_wave(), markers[1],
+                                    markers[2])
+                yield j, rendered, tuple(int(lst[j]) for lst in seq_lists)
+                del rendered
+                for waveform in element.values():
+                    if (id(waveform) in to_release and
+                            last.get(id(waveform), j) == j):
+                        to_release.pop(id(waveform))._release()
+        finally:
+            for waveform in to_release.values():
+                waveform._release()
+
+    @profiled('unwrap_deduplicated')
+    def unwrap_deduplicated(self):
+        """
+        Function which unwraps the sequence like unwrap but storing each
+        distinct (wave, m1, m2) only once, identified by content hash (see
+        Waveform.digest).
+
+        Returns:
+            - list of tuples (one per awg) of (table, indices, nreps,
+               trig_waits, goto_states, jump_tos, channels)
+
+               table is a list of unique (wave, m1, m2) tuples
+
+               indices is an int array of shape (channels, elements) of
+               the index in table of the waveform on each channel of each
+               element
+
+               all others are as for unwrap
+            - dict of stats: waveforms, unique_waveforms, bytes,
+               unique_bytes, bytes_saved
+        """
+        awg_ch_dict = self._get_awg_channels()
+        seq_lists = self._get_sequencing_lists()
+        stats = dict.fromkeys(['waveforms', 'unique_waveforms', 'bytes',
+                               'unique_bytes'], 0)
+        unwrapped_tuples = []
+        for awg, ch_list in awg_ch_dict.items():
+            table = []
+            table_index = {}
+            object_index = {}
+            indices = np.empty((len(ch_list), len(self._elements)),
+                               dtype=int)
+            for j, element in enumerate(self._elements):
+                for i, ch in enumerate(ch_list):
+                    waveform = element[awg * 4 + ch]
+                    index = object_index.get(id(waveform))
+                    if index is None:
+                        digest = waveform.digest()
+                        index = table_index.get(digest)
+                        if index is None:
+                            markers = waveform.markers
+                            entry = (waveform._read_wave(), markers[1],
+                                     markers[2])
+                            index = table_index[digest] = len(table)
+                            table.append(entry)
+                            stats['unique_bytes'] += sum(
+                                a.nbytes for a in entry)
+                        object_index[id(waveform)] = index
+                    indices[i, j] = index
+                    stats['bytes'] += sum(a.nbytes for a in table[index])
+            stats['waveforms'] += indices.size
+            stats['unique_waveforms'] += len(table)
+            unwrapped_tuples.append((table, indices) + seq_lists +
+                                    (ch_list,))
+        stats['bytes_saved'] = stats['bytes'] - stats['unique_bytes']
+        return unwrapped_tuples, stats
+
+    def fingerprint(self):
+        """
+        Function which fingerprints the rendered sequence by hashing the
+        waveform on each channel of each element (see Waveform.digest), eg
+        to be stored after an upload and compared with delta later.
+
+        Returns:
+            - dict of the form {'channels': [ch1, ch2, ...],
+               'digests': [[digest of ch1, digest of ch2, ...], ...],
+               'table': [[nrep, trig_wait, goto_state, jump_to], ...]}
+               with one entry in digests and table per element
+        """
+        channels = sorted(self._get_channels_used())
+        digests = []
+        for element in self._elements:
+            digests.append([element[ch].digest() if ch in element else None
+                            for ch in channels])
+        table = [[int(v) for v in row]
+                 for row in zip(*self._get_sequencing_lists())]
+        return {'channels': channels, 'digests': digests, 'table': table}
+
+    def delta(self, previous):
+        """
+        Function which compares the sequence with a previously unwrapped
+        one so that only what changed needs to be transferred.
+
+        Args:
+            - previous: Sequence or fingerprint (see fingerprint) of it
+
+        Returns:
+            - dict of the form
+               {'new': {digest: (element, channel)} of waveforms not in
+                   previous with where to find them in this sequence,
+                'reusable': set of digests of waveforms in both,
+                'removed': set of digests only in previous,
+                'changed': [(element, channel)] where the waveform differs
+                    from that at the same place in previous,
+                'table_rows': [element] whose sequencing row or waveforms
+                    differ from previous (including added elements),
+                'removed_rows': number of elements only in previous,
+                'fingerprint': fingerprint of this sequence}
+        """
+        if isinstance(previous, Sequence):
+            previous = previous.fingerprint()
+        current = self.fingerprint()
+        old_positions = {}
+        for j, row in enumerate(previous['digests']):
+            for ch, digest in zip(previous['channels'], row):
+                old_positions[j, ch] = digest
+        old_digests = set(old_positions.values()) - {None}
+        new = {}
+        reusable = set()
+        changed = []
+        table_rows = []
+        for j, row in enumerate(current['digests']):
+            row_changed = (j >= len(previous['table']) or
+                           current['table'][j] != list(previous['table'][j]))
+            for ch, digest in zip(current['channels'], row):
+                if digest is None:
+                    continue
+                if digest in old_digests:
+                    reusable.add(digest)
+                elif digest not in new:
+                    new[digest] = (j, ch)
+                if old_positions.get((j, ch)) != digest:
+                    changed.append((j, ch))
+                    row_changed = True
+            if row_changed:
+                table_rows.append(j)
+        used = set(d for row in current['digests'] for d in row)
+        return {'new': new,
+                'reusable': reusable,
+                'removed': old_digests - used,
+                'changed': changed,
+                'table_rows': table_rows,
+                'removed_rows': max(0, len(previous['table']) -
+                                    len(current['table'])),
+                'fingerprint': current}
+
+    def _get_awg_channels(self):
+        """
+        Function which splits the channels used into AWGs of 4 channels,
+        channel c of awg a (both indexed from 0) being channel 4 * a + c + 1
+        of the sequence.
+
+        Returns:
+            - dict of the form {awg: [channels of awg (1 to 4)]}
+        """
+        awg_ch_dict = {}
+        for chan in self._get_channels_used():
+            awg, channel = divmod(chan - 1, 4)
+            awg_ch_dict.setdefault(awg, []).append(channel + 1)
+        return awg_ch_dict
+
+    def _get_sequencing_lists(self):
+        """
+        Function which expands nreps, trig_waits, goto_states and jump_tos
+        into lists of the same length as the sequence.
+
+        Returns:
+            - tuple of (nreps, trig_waits, goto_states, jump_tos)
+        """
         if isinstance(self.nreps, int):
             nrep_list = [self.nreps] * len(self._elements)
         else:
@@ -234,13 +762,74 @@ class Sequence:
             jump_to_list = [self.jump_tos] * len(self._elements)
         else:
             jump_to_list = self.jump_tos
-        unwrapped_tuples = []
-        for awg in awg_ch_dict:
-            ch_list = awg_ch_dict[awg]
-            unwrapped_tuples.append(
-                (wf_dict[awg], m1_dict[awg], m2_dict[awg], nrep_list,
-                    trig_wait_list, goto_state_list, jump_to_list, ch_list))
-        return unwrapped_tuples
+        return (nrep_list, trig_wait_list, goto_state_list, jump_to_list)
+
+    def save(self, path: str):
+        """
+        Function which renders the sequence into a directory of contiguous
+        per-channel sample and marker blocks with a sequencing table and
+        JSON manifest (see store.save_sequence).
+
+        Args:
+            path: directory to save into
+        """
+        save_sequence(self, path)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r'):
+        """
+        Function which reopens a sequence saved with Sequence.save with
+        waves and markers memory mapped (see store.load_sequence).
+
+        Args:
+            path: directory the sequence was saved into
+            mmap_mode: numpy memory map mode (default 'r')
+
+        Returns:
+            Sequence
+        """
+        return load_sequence(path, cls, mmap_mode=mmap_mode)
+
+    def write_awg_file(self, file, awg: int = 0,
+                       amplitude: Union[float, dict] = 1.0,
+                       deduplicate: bool = True, settings: dict = None):
+        """
+        Function which streams the channels of one AWG of the sequence into
+        an AWG5014 .awg file without holding the rendered sequence in
+        memory (see awg.write_awg_file).
+
+        Args:
+            file: path or binary file handle to write to
+            awg: index of the AWG whose channels are written (default 0)
+            amplitude: wave value corresponding to full scale, either one
+                value or a dict of the form {channel: amplitude}
+            deduplicate: write waveforms with identical content only once
+            settings: optional dict of extra records of the form
+                {name: (value, struct format)}
+
+        Returns:
+            dict of stats: waveforms (number written), samples, clipped
+        """
+        return write_awg_file(self, file, awg=awg, amplitude=amplitude,
+                              deduplicate=deduplicate, settings=settings)
+
+    @classmethod
+    def from_awg_file(cls, path: str):
+        """
+        Function which reads an AWG5014 .awg file into a Sequence (see
+        awg.AWGFile to inspect a file without loading it whole), with the
+        sample rate of the file.
+
+        Args:
+            path: path of the .awg file
+
+        Returns:
+            Sequence
+        """
+        awg_file = read_awg_file(path)
+        sequence = cls(sample_rate=awg_file.settings.get('SAMPLING_RATE'))
+        sequence.wrap(awg_file.to_tuple())
+        return sequence
 
     def wrap(self, tup: Tuple[tuple, dict]):
         """
@@ -291,41 +880,97 @@ class Sequence:
                 waveform.wave = wf_lists[i][j]
                 markers = Segment._raw_to_points({1: m1_lists[i][j],
                                                   2: m2_lists[i][j]})
-                for i in [1, 2]:
-                    for m in markers[i]:
-                        waveform.add_marker(i, m['delay_points'],
-                                            m['duration_points'])
+                for m in [1, 2]:
+                    for delay, duration in zip(
+                            markers[m]['delay_points'],
+                            markers[m]['duration_points']):
+                        waveform.add_marker(m, delay, duration)
                 element.add_waveform(waveform)
             self.add_element(element)
 
         self.check()
 
-    def check(self):
+    @profiled('check')
+    def validate(self, workers: int = None, backend: str = 'thread'):
         """
-        Function which checks the sequence, passing if:
+        Function which validates the sequence from metadata only (nothing
+        is rendered) checking that:
         1) sequence has nonzero length
         2) if present variable array is the same length as sequence
-        3) nreps, trig_waits, goto_states are ints or lists
+        3) nreps, trig_waits, goto_states, jump_tos are ints or lists
            of the same length as the sequence
         4) each element passes element check
         5) all elements have the same number of waveforms in
+        Element results are cached until the element is mutated.
+
+        Args:
+            workers: optional number of threads or processes to validate
+                elements in parallel with (results found in processes are
+                not cached)
+            backend: 'thread' (default) or 'process', see
+                parallel.map_elements
+
+        Returns:
+            validation.ValidationReport
         """
-        if not self._elements:
-            raise RuntimeError('no elements in sequence')
-        self._test_variable_array_length()
-        self._test_sequence_variables()
-        for i, element in enumerate(self._elements):
-            try:
-                element.check()
-            except Exception as e:
-                raise Exception(
-                    'error in element {}: {}'.format(i, e))
-        self._test_element_waveform_count()
-        print('sequence check passed: {} elements'.format(len(self)))
+        errors = None
+        if workers is not None and len(self._elements):
+            errors = map_elements(check_element, self._elements, workers,
+                                  backend)
+        return validate_sequence(self, errors)
+
+    def check(self, workers: int = None, backend: str = 'thread'):
+        """
+        Function which checks the sequence (see validate) and raises a
+        RuntimeError listing the errors if it fails.
+
+        Args:
+            workers: optional number of threads or processes to check
+                elements in parallel with
+            backend: 'thread' (default) or 'process', see
+                parallel.map_elements
+
+        Returns:
+            True
+        """
+        report = self.validate(workers=workers, backend=backend)
+        report.raise_errors()
+        log.info('sequence check passed: {} elements'.format(len(self)))
         return True
 
+    @staticmethod
+    def render_stats(reset: bool = False):
+        """
+        Function which gets the calls, wall time and bytes of arrays
+        returned by each render stage recorded since profiling was enabled
+        with chickpea.profiling.enable() (see profiling.Profiler). The
+        stats are for all rendering in the process, not just of this
+        sequence.
+
+        Args:
+            reset: if True clear the stats after reading them
+
+        Returns:
+            dict of the form {stage: {'calls': int, 'time': float (s),
+            'returned_bytes': int}}
+        """
+        stats = profiling.stats()
+        if reset:
+            profiling.reset()
+        return stats
+
     def copy(self):
-        return copy.deepcopy(self)
+        """
+        Returns:
+            copy of the sequence with each element copied (sharing
+            unmutated data, see Waveform.copy)
+        """
+        new = copy.copy(self)
+        new._elements = [e.copy() for e in self._elements]
+        new.labels = copy.deepcopy(self.labels)
+        for attr in ['nreps', 'trig_waits', 'goto_states', 'jump_tos']:
+            setattr(new, attr, copy.copy(getattr(self, attr)))
+        return new
 
     def has_key(self, k):
         return k in self._elements
@@ -336,7 +981,8 @@ class Sequence:
     def pop(self, *args):
         return self._elements.pop(*args)
 
-    def plot(self, elemnum: int=0, channels: List[int]=None):
+    def plot(self, elemnum: int=0, channels: List[int]=None,
+             max_points: int = None):
         """
         Function which plots channels and markers
 
@@ -344,12 +990,14 @@ class Sequence:
             sequence to plot
             elemnum to plot (default 0)
             channels (default [1, 2]) to plot
+            max_points: maximum number of points to draw for each channel
+                (see Waveform.plot)
 
         Returns:
             matplotlib fig
         """
         elem = self[elemnum]
-        return elem.plot(channels=channels)
+        return elem.plot(channels=channels, max_points=max_points)
 
     def print_segment_lists(self, elemnum: int=0, channels: List[int]=None):
         """
@@ -361,57 +1009,152 @@ class Sequence:
         elem = self[elemnum]
         elem.print_segment_lists(channels=channels)
 
-    def _test_variable_array_length(self):
-        """
-        Test which raises an exception if there is a variable array set
-        that does not correspond to the length of the sequence
-        """
-        if (self.variable_array is not None and
-                len(self.variable_array) != len(self)):
-            raise Exception(
-                'number of elements in sequence does not match length of '
-                'variable_array defined by setting start, stop, step on '
-                'initialisation. Variable array length {}, sequence '
-                'length{}'.format(len(self.variable_array), len(self)))
-
-    def _test_sequence_variables(self):
-        """
-        Test which checks the validity of nreps, trig_waits and goto_states
-        for use with the unwrap function to generate a sequence
-        """
-        if all(isinstance(i, int) for i in
-               [self.nreps, self.trig_waits, self.goto_states]):
-            return
-        elif not (isinstance(self.nreps, list) or
-                  len(self.nreps) != len(self._elements)):
-            raise Exception('nreps must be an int or a list of the same length'
-                            ' as the sequence')
-        elif not (isinstance(self.trig_waits, list) or
-                  len(self.trig_waits) != len(self._elements)):
-            raise Exception('trig_waits must be an int or a list of the same '
-                            'length as the sequence')
-        elif not (isinstance(self.goto_states, list) or
-                  len(self.goto_states) != len(self._elements)):
-            raise Exception('goto_states must be an int or a list of the same '
-                            'length as the sequence')
-        pass
-
-    def _test_element_waveform_count(self):
-        lengths = [len(element) for element in self._elements]
-        # option1: all elements have same number of waveforms
-        option1 = lengths.count(lengths[0]) == len(self._elements)
-        # option2: first element has most waveforms and others have same number
-        if len(self._elements) > 1:
-            option2 = (all(i < lengths[0] for i in lengths[1:]) and
-                       (lengths.count(lengths[1]) == (len(lengths) - 1)))
-        else:
-            option2 = False
-        if not option1 or option2:
-            raise Exception(
-                'the elements of this sequence are '
-                'not of lengths [l, l, ...] or lengths'
-                ' [m, l, l, ...] where m > l : {}'.format(str(lengths)))
-        if option2:
-            raise NotImplementedError('awg upload doesn\'t support '
-                                      '  [m, l, l, ...] where m > l format:'
-                                      ' format given: {}'.format(str(lengths)))
+
+class _LazyElements:
+    """
+    Read only list-like container of elements which creates each element
+    with a factory function when it is used, keeping only the most
+    recently used elements.
+    """
+
+    def __init__(self, length: int, factory, cache_size: int):
+        self._length = length
+        self._factory = factory
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self.sample_rate = None
+
+    def __len__(self):
+        return self._length
+
+    def __repr__(self):
+        return '<{} lazy elements>'.format(self._length)
+
+    def _get(self, index: int):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('element index out of range')
+        element = self._cache.get(index)
+        if element is not None:
+            self._cache.move_to_end(index)
+            return element
+        element = self._factory(index)
+        if self.sample_rate is not None:
+            if element.sample_rate is None:
+                element.sample_rate = self.sample_rate
+            elif element.sample_rate != self.sample_rate:
+                raise ValueError('factory made element {} with a different '
+                                 'sample rate to that of the sequence. '
+                                 'element SR: {}, sequence SR: {}'.format(
+                                     index, element.sample_rate,
+                                     self.sample_rate))
+        if self._cache_size:
+            self._cache[index] = element
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return element
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._get(i) for i in range(*key.indices(self._length))]
+        return self._get(key)
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield self._get(i)
+
+    def clear_cache(self):
+        self._cache.clear()
+
+
+class LazySequence(Sequence):
+    """
+    Sequence defined by a length and a function which makes the Element at
+    each index. Elements are only made when they are used (by indexing,
+    iterating, unwrap, check, plot, ...) and only a few recently used ones
+    are kept, so memory use does not grow with the length of the sequence.
+    Elements cannot be added, removed or replaced.
+    """
+
+    def __init__(self, length: int, factory, cache_size: int = 16,
+                 **kwargs):
+        """
+        Args:
+            length: number of elements
+            factory: function of the element index returning an Element,
+                called again if an element is needed after it has left the
+                cache so it should return equivalent elements each time
+            cache_size: number of recently used elements to keep
+                (default 16)
+            kwargs: passed on to Sequence (eg name, nreps, sample_rate)
+        """
+        super().__init__(**kwargs)
+        sample_rate = self._sample_rate
+        self._elements = _LazyElements(length, factory, cache_size)
+        self._elements.sample_rate = sample_rate
+
+    @classmethod
+    def from_template(cls, template: Element, length: int, update,
+                      **kwargs):
+        """
+        Function which makes a lazy sequence of copies of a template
+        element each updated by a function of the element index.
+
+        Args:
+            template: element to copy
+            length: number of elements
+            update: function of (element, index) which modifies the
+                element copy in place
+            kwargs: passed on to LazySequence
+
+        Returns:
+            LazySequence
+        """
+        def factory(index):
+            element = template.copy()
+            update(element, index)
+            return element
+        return cls(length, factory, **kwargs)
+
+    def __setitem__(self, key: int, value: Element):
+        raise TypeError('elements of a LazySequence cannot be replaced')
+
+    def __delitem__(self, key: int):
+        raise TypeError('elements of a LazySequence cannot be deleted')
+
+    def _set_sample_rate(self, val: float):
+        self._sample_rate = val
+        if isinstance(getattr(self, '_elements', None), _LazyElements):
+            self._elements.sample_rate = val
+            self._elements.clear_cache()
+
+    sample_rate = property(fget=Sequence._get_sample_rate,
+                           fset=_set_sample_rate)
+
+    def add_element(self, element: Element, position: int = None):
+        raise TypeError('elements cannot be added to a LazySequence, they '
+                        'are made by its factory')
+
+    def pop(self, *args):
+        raise TypeError('elements of a LazySequence cannot be removed')
+
+    def clear(self):
+        raise TypeError('a LazySequence cannot be cleared')
+
+    def wrap(self, tup: Tuple[tuple, dict]):
+        raise TypeError('cannot wrap into a LazySequence')
+
+    def copy(self):
+        """
+        Returns:
+            LazySequence with the same factory (and no cached elements)
+        """
+        new = copy.copy(self)
+        new._elements = _LazyElements(len(self), self._elements._factory,
+                                      self._elements._cache_size)
+        new._elements.sample_rate = self._sample_rate
+        new.labels = copy.deepcopy(self.labels)
+        for attr in ['nreps', 'trig_waits', 'goto_states', 'jump_tos']:
+            setattr(new, attr, copy.copy(getattr(self, attr)))
+        return new
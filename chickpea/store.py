@@ -0,0 +1,176 @@
+import json
+import os
+
+import numpy as np
+
+from . import Segment, Waveform, Element
+
+FORMAT = 'chickpea-sequence'
+VERSION = 1
+
+
+def _channel_file(path, channel, kind):
+    return os.path.join(path, 'ch{}_{}.npy'.format(channel, kind))
+
+
+def save_sequence(sequence, path: str):
+    """
+    Function which renders a sequence into a directory of contiguous
+    per-channel blocks which can be memory mapped by load_sequence:
+
+        manifest.json: metadata (name, variable, labels, ...)
+        table.npy: (elements, 4) sequencing table of
+            (nreps, trig_wait, goto_state, jump_to)
+        offsets.npy: (elements + 1) start point of each element
+        ch<c>_wave.npy: waves of all elements on channel c
+        ch<c>_markers.npy: (2, points) markers of all elements
+        ch<c>_intervals.npy: (n, 4) markers as
+            (element, marker, delay_points, duration_points)
+        variable_arrays.npy: optional (axes, elements) variable arrays
+
+    Elements are rendered and written one at a time (see
+    Sequence.iter_unwrap).
+
+    Args:
+        sequence: Sequence to save
+        path: directory to save into (created if it does not exist)
+    """
+    if not len(sequence):
+        raise RuntimeError('no elements in sequence')
+    channels = sorted(sequence[0].keys())
+    lengths = []
+    for j, element in enumerate(sequence):
+        if sorted(element.keys()) != channels:
+            raise ValueError('all elements must use the same channels to be '
+                             'saved, element {} uses {} not {}'.format(
+                                 j, sorted(element.keys()), channels))
+        element_lengths = set(len(element[c]) for c in channels)
+        if len(element_lengths) != 1:
+            raise ValueError('waveforms of element {} are not of equal '
+                             'length: {}'.format(j, element_lengths))
+        lengths.append(element_lengths.pop())
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    os.makedirs(path, exist_ok=True)
+    waves = {}
+    markers = {}
+    for c in channels:
+        waves[c] = np.lib.format.open_memmap(
+            _channel_file(path, c, 'wave'), mode='w+', dtype=np.float64,
+            shape=(int(offsets[-1]),))
+        markers[c] = np.lib.format.open_memmap(
+            _channel_file(path, c, 'markers'), mode='w+', dtype=np.uint8,
+            shape=(2, int(offsets[-1])))
+    intervals = {c: [] for c in channels}
+    table = np.empty((len(sequence), 4), dtype=np.int64)
+    for j, rendered, row in sequence.iter_unwrap():
+        start, stop = offsets[j], offsets[j + 1]
+        table[j] = row
+        for c in channels:
+            wave, m1, m2 = rendered[c]
+            waves[c][start:stop] = wave
+            markers[c][0, start:stop] = m1
+            markers[c][1, start:stop] = m2
+            points = Segment._raw_to_points({1: m1, 2: m2})
+            for m in [1, 2]:
+                delays = points[m]['delay_points']
+                intervals[c].append(np.column_stack([
+                    np.full(len(delays), j), np.full(len(delays), m),
+                    delays, points[m]['duration_points']]).astype(np.int64))
+    for c in channels:
+        waves[c].flush()
+        markers[c].flush()
+        np.save(_channel_file(path, c, 'intervals'),
+                np.concatenate(intervals[c]).reshape(-1, 4))
+    del waves, markers
+    np.save(os.path.join(path, 'table.npy'), table)
+    np.save(os.path.join(path, 'offsets.npy'), offsets)
+    if sequence.variable_arrays is not None:
+        np.save(os.path.join(path, 'variable_arrays.npy'),
+                np.array(sequence.variable_arrays))
+
+    manifest = {'format': FORMAT,
+                'version': VERSION,
+                'name': sequence.name,
+                'variable': sequence.variable,
+                'variable_label': sequence.variable_label,
+                'variable_unit': sequence.variable_unit,
+                'start': sequence.start,
+                'stop': sequence.stop,
+                'step': sequence.step,
+                'labels': sequence.labels,
+                'sample_rate': sequence.sample_rate,
+                'channels': channels,
+                'elements': len(sequence)}
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_sequence(path: str, sequence_class, mmap_mode: str = 'r'):
+    """
+    Function which reopens a sequence saved by save_sequence with the
+    waves and markers memory mapped, so nothing is read until it is used
+    and unwrapping does not copy them.
+
+    Args:
+        path: directory the sequence was saved into
+        sequence_class: class of the sequence to make
+        mmap_mode: numpy memory map mode (default 'r'), None reads the
+            whole sequence into memory
+
+    Returns:
+        Sequence
+    """
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT:
+        raise ValueError('{} is not a saved chickpea sequence'.format(path))
+    elif manifest['version'] > VERSION:
+        raise ValueError('saved sequence format version {} not '
+                         'supported'.format(manifest['version']))
+    table = np.load(os.path.join(path, 'table.npy'))
+    offsets = np.load(os.path.join(path, 'offsets.npy'))
+    sequence = sequence_class(
+        name=manifest['name'], variable=manifest['variable'],
+        variable_label=manifest['variable_label'],
+        variable_unit=manifest['variable_unit'], start=manifest['start'],
+        stop=manifest['stop'], step=manifest['step'],
+        nreps=table[:, 0].tolist(), trig_waits=table[:, 1].tolist(),
+        goto_states=table[:, 2].tolist(), jump_tos=table[:, 3].tolist(),
+        labels=manifest['labels'], sample_rate=manifest['sample_rate'])
+    variable_arrays_file = os.path.join(path, 'variable_arrays.npy')
+    if os.path.exists(variable_arrays_file):
+        sequence.variable_arrays = list(np.load(variable_arrays_file))
+
+    channels = manifest['channels']
+    waves = {}
+    markers = {}
+    intervals = {}
+    for c in channels:
+        waves[c] = np.load(_channel_file(path, c, 'wave'),
+                           mmap_mode=mmap_mode)
+        markers[c] = np.load(_channel_file(path, c, 'markers'),
+                             mmap_mode=mmap_mode)
+        ivals = np.load(_channel_file(path, c, 'intervals'))
+        bounds = np.searchsorted(ivals[:, 0],
+                                 np.arange(manifest['elements'] + 1))
+        intervals[c] = (ivals, bounds)
+
+    for j in range(manifest['elements']):
+        start, stop = offsets[j], offsets[j + 1]
+        element = Element()
+        for c in channels:
+            ivals, bounds = intervals[c]
+            element_ivals = ivals[bounds[j]:bounds[j + 1]]
+            points = {}
+            for m in [1, 2]:
+                rows = element_ivals[element_ivals[:, 1] == m]
+                points[m] = {'delay_points': rows[:, 2].tolist(),
+                             'duration_points': rows[:, 3].tolist()}
+            waveform = Waveform._from_rendered(
+                waves[c][start:stop],
+                {1: markers[c][0, start:stop], 2: markers[c][1, start:stop]},
+                points, channel=c)
+            element.add_waveform(waveform)
+        sequence.add_element(element)
+    return sequence
@@ -0,0 +1,225 @@
+import logging
+import numbers
+
+log = logging.getLogger(__name__)
+
+
+class ValidationReport:
+    """
+    Result of validating a sequence. Errors are kept as a list of
+    (element index, message) where the index is None for errors in the
+    sequence as a whole.
+    """
+
+    def __init__(self, elements: int):
+        """
+        Args:
+            elements: number of elements in the sequence
+        """
+        self.elements = elements
+        self.validated = 0
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return '<ValidationReport: {} elements ({} validated, {} cached), ' \
+               '{} errors>'.format(self.elements, self.validated,
+                                   self.elements - self.validated,
+                                   len(self.errors))
+
+    def add_error(self, index, message: str):
+        self.errors.append((index, message))
+
+    def messages(self):
+        """
+        Returns:
+            list of error messages including the element they are in
+        """
+        return [message if index is None else
+                'error in element {}: {}'.format(index, message)
+                for index, message in self.errors]
+
+    def raise_errors(self):
+        """
+        Function which raises a RuntimeError listing all errors if there
+        are any.
+        """
+        if self.errors:
+            raise RuntimeError('sequence check failed: ' +
+                               '; '.join(self.messages()))
+
+
+def validate_waveform(waveform):
+    """
+    Function which checks a waveform without rendering it:
+    1) wave is not None
+    2) the length can be found (from the segment point counters if the
+       segments have them)
+    3) if segments present they all have a duration
+    The result is cached on the waveform until it is mutated.
+
+    Args:
+        waveform
+
+    Returns:
+        errors (list of messages), length (None if not known)
+    """
+    key = waveform._check_key()
+    if waveform._validated is not None and waveform._validated[0] == key:
+        return waveform._validated[1:]
+    errors = []
+    length = None
+    if waveform.segment_list is None and waveform._wave is None:
+        errors.append('Wave is None')
+    else:
+        try:
+            length = len(waveform)
+        except Exception as e:
+            errors.append('could not get length: {}'.format(e))
+    if waveform.segment_list is not None:
+        for s in waveform.segment_list:
+            try:
+                s.duration
+            except Exception as e:
+                errors.append('segment_list present but failed to get '
+                              'duration for segment {}: {}'.format(s, e))
+                break
+    waveform._validated = (key, errors, length)
+    return errors, length
+
+
+def validate_element(element):
+    """
+    Function which checks an element without rendering it:
+    1) element dictionary is not empty
+    2) channels are ints
+    3) each waveform passes validate_waveform
+    4) the lengths of the waveforms are all the same
+    The result is cached on the element until it or its waveforms are
+    mutated.
+
+    Args:
+        element
+
+    Returns:
+        errors (list of messages), length (None if not known)
+    """
+    key = element._check_key()
+    if element._validated is not None and element._validated[0] == key:
+        return element._validated[1:]
+    errors = []
+    lengths = []
+    if not element._waveforms:
+        errors.append('no waveforms in element')
+    if any(type(k) is not int for k in element._waveforms.keys()):
+        errors.append('Found non int waveform channel in element '
+                      'dict. Keys: {}'.format(list(element._waveforms.keys())))
+    for ch, waveform in element._waveforms.items():
+        waveform_errors, length = validate_waveform(waveform)
+        errors.extend('error in waveform on channel {}: {}'.format(ch, e)
+                      for e in waveform_errors)
+        lengths.append(length)
+    length = None
+    if lengths and None not in lengths:
+        if lengths.count(lengths[0]) != len(lengths):
+            errors.append('the waveforms of this element are not of equal '
+                          'length: {}'.format(lengths))
+        else:
+            length = lengths[0]
+    element._validated = (key, errors, length)
+    return errors, length
+
+
+def element_errors(element):
+    """
+    Function which returns the errors found by validate_element, for use
+    with parallel.map_elements.
+    """
+    return validate_element(element)[0]
+
+
+def _setting_error(name: str, value, length: int):
+    if isinstance(value, numbers.Integral):
+        return None
+    try:
+        value_length = len(value)
+    except TypeError:
+        return '{} must be an int or a list, found {}'.format(name, value)
+    if value_length != length:
+        return ('{} must be an int or a list of the same length as the '
+                'sequence ({}), found length {}'.format(name, length,
+                                                        value_length))
+    return None
+
+
+def validate_sequence(sequence, element_errors_list=None):
+    """
+    Function which checks a sequence using only metadata (nothing is
+    rendered):
+    1) sequence has nonzero length
+    2) if present variable array is the same length as sequence
+    3) nreps, trig_waits, goto_states, jump_tos are ints or lists
+       of the same length as the sequence
+    4) each element passes validate_element
+    5) all elements have the same number of waveforms
+
+    Args:
+        sequence
+        element_errors_list: optional list of the errors of each element if
+            they have already been found (eg in parallel)
+
+    Returns:
+        ValidationReport
+    """
+    elements = sequence._elements
+    report = ValidationReport(len(elements))
+    if not len(elements):
+        report.add_error(None, 'no elements in sequence')
+        return report
+
+    if sequence.variable_arrays is not None:
+        variable_length = len(sequence.variable_arrays[0])
+    elif any(v is None for v in [sequence.start, sequence.stop,
+                                 sequence.step]):
+        variable_length = None
+    else:
+        variable_length = int(round(abs(sequence.stop - sequence.start) /
+                                    sequence.step + 1))
+    if variable_length is not None and variable_length != len(elements):
+        report.add_error(
+            None, 'number of elements in sequence does not match length of '
+            'variable_array. Variable array length {}, sequence '
+            'length {}'.format(variable_length, len(elements)))
+
+    for name in ['nreps', 'trig_waits', 'goto_states', 'jump_tos']:
+        error = _setting_error(name, getattr(sequence, name), len(elements))
+        if error is not None:
+            report.add_error(None, error)
+
+    counts = []
+    for i, element in enumerate(elements):
+        if element_errors_list is not None:
+            errors = element_errors_list[i]
+            report.validated += 1
+        else:
+            previous = element._validated
+            errors = validate_element(element)[0]
+            if element._validated is not previous:
+                report.validated += 1
+        for e in errors:
+            report.add_error(i, e)
+        counts.append(len(element))
+
+    if counts.count(counts[0]) != len(counts):
+        odd = [i for i, c in enumerate(counts) if c != counts[0]]
+        report.add_error(None, 'the elements of this sequence do not all '
+                               'have the same number of waveforms: element '
+                               '0 has {}, elements {} do not'.format(
+                                   counts[0], odd[:10]))
+    return report
@@ -1,19 +1,43 @@
 import numpy as np
+import hashlib
 import math
 import copy
 import logging
-import warnings
-
-try:
-    import matplotlib.pyplot as plt
-except RuntimeError as e:
-    warnings.warn('Could not import matplotlib {}'.format(e))
 
 from . import Segment
+from .awg import pack_waveform
+from .segment import _versions
+from .validation import validate_waveform
+from .profiling import profiled
+from .plotting import pyplot, plot_waveform
+from .compressed import CompressedWave, segment_runs, MIN_RUN
 
 log = logging.getLogger(__name__)
 
 
+def _paint_intervals(length: int, starts: np.ndarray, stops: np.ndarray):
+    """
+    Function which rasterises (possibly overlapping) on intervals into an
+    array of 1s and 0s using a difference array and cumulative sum.
+
+    Args:
+        length: number of points in the output
+        starts: array of interval start points
+        stops: array of interval stop points (exclusive)
+
+    Returns:
+        uint8 numpy array of length points
+    """
+    starts = np.clip(starts, 0, length)
+    stops = np.clip(stops, 0, length)
+    keep = stops > starts
+    if not keep.any():
+        return np.zeros(length, dtype=np.uint8)
+    edges = (np.bincount(starts[keep], minlength=length + 1) -
+             np.bincount(stops[keep], minlength=length + 1))
+    return (np.cumsum(edges[:-1]) > 0).view(np.uint8)
+
+
 class Waveform:
     """
     Waveform class which represents the wave and markers
@@ -40,14 +64,49 @@ class Waveform:
             raise RuntimeError('Cannot set length and segment list')
         else:
             self._wave = None
+        self._wave_shared = False
         self._markers = None
-
-        self.segment_list = copy.deepcopy(segment_list)
+        self._markers_shared = False
+        self._markers_version = next(_versions)
+        self._rendered = None
+        self._rendered_markers = None
+        self._digest = None
+        self._validated = None
+        self._offsets = None
+
+        if segment_list is not None:
+            segment_list = [s.copy() for s in segment_list]
+        self.segment_list = segment_list
         if sample_rate is not None:
             self.sample_rate = sample_rate
         else:
             self._sample_rate = None
 
+    @classmethod
+    def _from_rendered(cls, wave: np.ndarray, markers: dict,
+                       intervals: dict, channel: int = None,
+                       sample_rate: float = None):
+        """
+        Function which makes a waveform from an already rendered wave and
+        markers (eg memory mapped from file) without copying them. The wave
+        is treated as shared so it is copied before being written to.
+
+        Args:
+            wave: wave array
+            markers: dict of form {1: array, 2: array} of rendered markers
+            intervals: dict of the markers as delays and durations of the
+                form {1: {'delay_points': [], 'duration_points': []}, 2: ...}
+            channel: optional channel
+            sample_rate: optional sample rate
+        """
+        waveform = cls(channel=channel, sample_rate=sample_rate)
+        waveform._wave = wave
+        waveform._wave_shared = True
+        waveform._markers = intervals
+        waveform._rendered_markers = (
+            (waveform._markers_version, len(wave)), dict(markers))
+        return waveform
+
     def _get_duration(self):
         try:
             segment_durations = [s.duration for s in self.segment_list]
@@ -65,88 +124,478 @@ class Waveform:
     def _set_sample_rate(self, val):
         if self.segment_list is not None:
             for s in self.segment_list:
-                s.func_args['SR'] = val
+                if s.func_args.get('SR') != val:
+                    s.func_args['SR'] = val
         self._sample_rate = val
+        self._rendered = None
 
     def _get_sample_rate(self):
         return self._sample_rate
 
     sample_rate = property(fget=_get_sample_rate, fset=_set_sample_rate)
 
+    def _check_key(self):
+        """
+        Returns:
+            key which changes when anything checked by check changes
+        """
+        if self.segment_list is not None:
+            return self._render_key()
+        return self._markers_version, id(self._wave)
+
     def check(self):
         """
-        Checks:
+        Checks (without rendering the wave, see validation.validate_waveform):
         1) wave is not none
-        2) if segments present they all have a duration
-        2) if segments present that sum of thier durations is same as that
-            of wave
+        2) the length of the wave can be found
+        3) if segments present they all have a duration
         """
-        if self.wave is None:
-            raise RuntimeError('Wave is None')
-        if self.segment_list is not None:
-            try:
-                segments_dur = math.fsum(
-                    [s.duration for s in self.segment_list])
-            except Exception as e:
-                raise RuntimeError('segment_list present but failed to get '
-                                   'duration for all segments: {}'.format(e))
-            if segments_dur != self.duration:
-                raise RuntimeError('duration of segments not equal to duration'
-                                   ' of wave {} != {}'.format(
-                                       segments_dur, self.duration))
+        errors = validate_waveform(self)[0]
+        if errors:
+            raise RuntimeError(errors[0])
         return True
 
     def __len__(self):
-        try:
-            wave = self.wave
-        except Exception as e:
-            raise RuntimeError('Could not get wave to evaluate '
-                               'length: {}'.format(e))
-        if wave is None:
+        if self.segment_list is not None:
+            return int(self._segment_offsets()[-1])
+        if self._wave is None:
             raise RuntimeError('wave is None, cannot get length')
-        return len(self.wave)
+        return len(self._wave)
 
-    def _get_wave(self):
-        if self.segment_list is not None:
-            return np.concatenate([s.points for s in self.segment_list])
+    def _render_key(self):
+        """
+        Returns:
+            tuple of the states of the segments in the segment list which
+            changes when a segment is added, removed or mutated
+        """
+        return tuple(s._state for s in self.segment_list)
+
+    def _segment_offsets(self):
+        """
+        Function which gets the prefix sums of the segment lengths, cached
+        until the segment list changes.
+
+        Returns:
+            int64 numpy array of the start point of each segment followed
+            by the length of the waveform
+        """
+        key = self._render_key()
+        if self._offsets is None or self._offsets[0] != key:
+            offsets = np.zeros(len(self.segment_list) + 1, dtype=np.int64)
+            np.cumsum([len(s) for s in self.segment_list], out=offsets[1:])
+            offsets.setflags(write=False)
+            self._offsets = (key, offsets)
+        return self._offsets[1]
+
+    @property
+    def segment_offsets(self):
+        """
+        Start point of each segment followed by the length of the waveform
+        (read only), None if the waveform is not made of segments.
+        """
+        if self.segment_list is None:
+            return None
+        return self._segment_offsets()
+
+    def segment_at(self, sample: int):
+        """
+        Function which finds the segment containing a point by binary search
+        of the segment offsets.
+
+        Args:
+            sample: point number
+
+        Returns:
+            index of the segment in the segment list, point number within
+            the segment
+        """
+        if self.segment_list is None:
+            raise RuntimeError('waveform is not made of segments')
+        offsets = self._segment_offsets()
+        if not 0 <= sample < offsets[-1]:
+            raise IndexError('point {} out of range for waveform of length '
+                             '{}'.format(sample, offsets[-1]))
+        index = int(np.searchsorted(offsets, sample, side='right')) - 1
+        return index, int(sample - offsets[index])
+
+    def time_to_sample(self, time: float):
+        """
+        Function which converts a time from the start of the waveform to
+        the number of the point at that time.
+
+        Args:
+            time: time (s)
+
+        Returns:
+            point number
+        """
+        if self.sample_rate is None:
+            raise RuntimeError('Cannot convert time as sample_rate is None')
+        return int(round(time * self.sample_rate))
+
+    def segment_at_time(self, time: float):
+        """
+        Function which finds the segment playing at a time from the start
+        of the waveform (see segment_at).
+
+        Args:
+            time: time (s)
+
+        Returns:
+            index of the segment in the segment list, point number within
+            the segment
+        """
+        return self.segment_at(self.time_to_sample(time))
+
+    @profiled('wave')
+    def _render(self):
+        """
+        Function which renders the segment list by writing the points of
+        each segment directly into one preallocated array at its offset.
+
+        Returns:
+            wave (numpy array)
+        """
+        return self._render_window(0, len(self))
+
+    def _render_window(self, start: int, stop: int, out: np.ndarray = None):
+        """
+        Function which renders points start to stop of the segment list,
+        generating only the segments which overlap them.
+
+        Args:
+            start: first point
+            stop: point after the last
+            out: optional array of stop - start points to write into
+
+        Returns:
+            wave (numpy array)
+        """
+        offsets = self._segment_offsets()
+        wave = np.empty(stop - start) if out is None else out
+        first = int(np.searchsorted(offsets, start, side='right')) - 1
+        for i in range(max(first, 0), len(self.segment_list)):
+            seg_start, seg_stop = offsets[i], offsets[i + 1]
+            if seg_start >= stop:
+                break
+            if seg_stop <= start:
+                continue
+            seg = self.segment_list[i]
+            points = seg._read_points()
+            if len(points) != seg_stop - seg_start:
+                raise RuntimeError('segment {} generated {} points but '
+                                   'declared {}'.format(
+                                       seg, len(points), seg_stop - seg_start))
+            lo = max(start, seg_start)
+            hi = min(stop, seg_stop)
+            wave[lo - start:hi - start] = points[lo - seg_start:
+                                                 hi - seg_start]
+        return wave
+
+    def render_into(self, wave: np.ndarray, markers: np.ndarray = None):
+        """
+        Function which renders the wave and markers into given arrays (eg
+        rows of a larger block), writing each segment in place. A wave or
+        markers which are already rendered are copied instead, otherwise
+        nothing is cached on the waveform.
+
+        Args:
+            wave: float array of len(self) points to write the wave into
+            markers: optional uint8 array of shape (2, len(self)) to write
+                the markers into
+        """
+        length = len(self)
+        if len(wave) != length or (markers is not None and
+                                   markers.shape != (2, length)):
+            raise ValueError('arrays of {} and {} points given to render '
+                             'waveform of length {} into'.format(
+                                 wave.shape, getattr(markers, 'shape', None),
+                                 length))
+        if self.segment_list is None:
+            wave[:] = self._read_wave()
+        elif (self._rendered is not None and
+                self._rendered[0] == self._render_key()):
+            wave[:] = self._rendered[1]
+        else:
+            self._render_window(0, length, out=wave)
+        if markers is None:
+            return
+        if (self._rendered_markers is not None and
+                self._rendered_markers[0] == self._markers_key(length)):
+            markers[0] = self._rendered_markers[1][1]
+            markers[1] = self._rendered_markers[1][2]
+        else:
+            for i, (starts, stops) in self._marker_intervals().items():
+                markers[i - 1] = _paint_intervals(length, starts, stops)
+
+    def render(self, start: int = 0, stop: int = None):
+        """
+        Function which renders a window of the wave and markers, generating
+        only the segments which overlap it and painting only the part of the
+        markers inside it, eg to look at a short part of a long waveform. If
+        the whole wave is already rendered it is sliced instead.
+
+        Args:
+            start: first point (default 0)
+            stop: point after the last (default the end of the waveform)
+
+        Returns:
+            wave (numpy array), markers dict of form {1: array, 2: array}
+        """
+        length = len(self)
+        if stop is None:
+            stop = length
+        if not 0 <= start <= stop <= length:
+            raise IndexError('window {}:{} out of range for waveform of '
+                             'length {}'.format(start, stop, length))
+        if self.segment_list is None:
+            wave = np.array(self._wave[start:stop])
+        elif (self._rendered is not None and
+                self._rendered[0] == self._render_key()):
+            wave = np.array(self._rendered[1][start:stop])
         else:
+            wave = self._render_window(start, stop)
+        markers = {}
+        for i, (starts, stops) in self._marker_intervals().items():
+            markers[i] = _paint_intervals(stop - start, starts - start,
+                                          stops - start)
+        return wave, markers
+
+    def _read_wave(self):
+        """
+        Function which gets the wave, either as set explicitly or as
+        rendered from the segment list. The rendered wave is cached
+        (read only) until the segment list or any of its segments are
+        changed, which includes getting explicit segment points to edit
+        them in place (see Segment.points). An explicit wave may be shared
+        with copies of the waveform so must not be written to.
+
+        Returns:
+            wave (numpy array)
+        """
+        if self.segment_list is None:
+            if isinstance(self._wave, CompressedWave):
+                return self._wave.to_array()
             return self._wave
+        key = self._render_key()
+        if self._rendered is None or self._rendered[0] != key:
+            wave = self._render()
+            wave.setflags(write=False)
+            self._rendered = (key, wave)
+        return self._rendered[1]
+
+    def _get_wave(self):
+        """
+        Function which gets the wave. An explicit wave shared with copies
+        of the waveform is first copied so that it can safely be edited in
+        place (waves rendered from segments are read only).
+
+        Returns:
+            wave (numpy array)
+        """
+        if isinstance(self._wave, CompressedWave):
+            self._wave = self._wave.to_array()
+            self._wave_shared = False
+        elif self._wave_shared:
+            self._wave = np.array(self._wave)
+            self._wave_shared = False
+        return self._read_wave()
+
+    def compress(self, min_run: int = MIN_RUN):
+        """
+        Function which replaces an explicit wave by a CompressedWave
+        holding its constant runs (of at least min_run points) as (number
+        of points, value), eg for long mostly zero waves. The length,
+        markers, check and unwrap work without decompressing it and
+        getting wave decompresses it again. Waveforms made of segments
+        are already held compactly by their segments and are left as they
+        are (see render_compressed).
+
+        Args:
+            min_run: shortest run to store as constant (default 64)
+
+        Returns:
+            self
+        """
+        if (self.segment_list is None and self._wave is not None and
+                not isinstance(self._wave, CompressedWave)):
+            self._wave = CompressedWave.from_array(self._wave, min_run)
+            self._wave_shared = False
+        return self
+
+    def render_compressed(self, min_run: int = MIN_RUN):
+        """
+        Function which renders the wave and markers as CompressedWaves
+        without making the dense arrays. Segments whose generator function
+        declares constant runs (eg flat) are not generated at all.
+
+        Args:
+            min_run: shortest run of explicit points to store as constant
+                (default 64)
+
+        Returns:
+            wave (CompressedWave), markers dict of form
+                {1: CompressedWave, 2: CompressedWave}
+        """
+        if self.segment_list is None:
+            if isinstance(self._wave, CompressedWave):
+                wave = self._wave
+            else:
+                wave = CompressedWave.from_array(self._wave, min_run)
+        else:
+            runs = []
+            for seg in self.segment_list:
+                runs.extend(segment_runs(seg, min_run))
+            wave = CompressedWave(runs)
+        length = len(wave)
+        markers = {i: CompressedWave.from_intervals(length, starts, stops)
+                   for i, (starts, stops) in self._marker_intervals().items()}
+        return wave, markers
 
     def _set_wave(self, wave_array: np.ndarray):
         self.segment_list = None
+        self._rendered = None
         self._wave = wave_array
+        self._wave_shared = False
+        self._markers_version = next(_versions)
 
     wave = property(_get_wave, _set_wave)
 
+    def _marker_intervals(self):
+        """
+        Function which gathers the segment markers (offset by the segment
+        start) and the wave markers into arrays of start and stop points,
+        evaluating the markers of each segment only once.
+
+        Returns:
+            dict of form {1: (starts, stops), 2: (starts, stops)}
+        """
+        delays = {1: [], 2: []}
+        durations = {1: [], 2: []}
+        if self.segment_list is not None:
+            offsets = self._segment_offsets()
+            for seg, start in zip(self.segment_list, offsets):
+                seg_markers = seg.markers
+                for i in [1, 2]:
+                    if len(seg_markers[i]['delay_points']):
+                        delays[i].append(np.asarray(
+                            seg_markers[i]['delay_points'],
+                            dtype=np.int64) + start)
+                        durations[i].append(np.asarray(
+                            seg_markers[i]['duration_points'],
+                            dtype=np.int64))
+        if self._markers is not None:
+            for i in [1, 2]:
+                delays[i].append(np.asarray(self._markers[i]['delay_points'],
+                                            dtype=np.int64))
+                durations[i].append(np.asarray(
+                    self._markers[i]['duration_points'], dtype=np.int64))
+        intervals = {}
+        for i in [1, 2]:
+            if delays[i]:
+                starts = np.concatenate(delays[i])
+                stops = starts + np.concatenate(durations[i])
+            else:
+                starts = stops = np.zeros(0, dtype=np.int64)
+            intervals[i] = (starts, stops)
+        return intervals
+
     def _get_markers(self):
         """
         Function which gets wave markers and segment markers both specified
-        in delay and duration points. These are summed XOR and converted to
-        arrays of 1 and 0 of same length as wave.
+        in delay and duration points. These are summed OR and converted to
+        uint8 arrays of 1 and 0 of same length as wave. The arrays are
+        cached (read only) until the segments or wave markers change.
 
         Returns:
             marker dict of form {1: [], 2: []}
         """
-        markers = {1: np.zeros(len(self), dtype=int),
-                   2: np.zeros(len(self), dtype=int)}
+        length = len(self)
+        key = self._markers_key(length)
+        if (self._rendered_markers is None or
+                self._rendered_markers[0] != key):
+            self._rendered_markers = (key, self._paint_markers(length))
+        return dict(self._rendered_markers[1])
+
+    markers = property(fget=_get_markers)
 
+    def _markers_key(self, length: int):
+        """
+        Returns:
+            key of the rendered markers which changes when the segments or
+            wave markers change
+        """
         if self.segment_list is not None:
-            for i in [1, 2]:
-                start = 0
-                for seg in self.segment_list:
-                    for j, delay in enumerate(seg.markers[i]['delay_points']):
-                        duration = seg.markers[i]['duration_points'][j]
-                        markers[i][
-                            (start + delay): (start + duration + delay)] = 1
-                    start += len(seg)
-        if self._markers is not None:
-            for i in [1, 2]:
-                for j, delay in enumerate(self._markers[i]['delay_points']):
-                    duration = self._markers[i]['duration_points'][j]
-                    markers[i][delay:(duration + delay)] = 1
+            return self._render_key(), self._markers_version, length
+        return self._markers_version, length
+
+    @profiled('markers')
+    def _paint_markers(self, length: int):
+        """
+        Function which rasterizes the markers into read only arrays.
+
+        Args:
+            length: number of points
+
+        Returns:
+            marker dict of form {1: array, 2: array}
+        """
+        markers = {}
+        for i, (starts, stops) in self._marker_intervals().items():
+            markers[i] = _paint_intervals(length, starts, stops)
+            markers[i].setflags(write=False)
         return markers
 
-    markers = property(fget=_get_markers)
+    def _is_rendered(self):
+        return (self._rendered is not None or
+                self._rendered_markers is not None)
+
+    def _release(self):
+        """
+        Function which drops the cached rendered wave and markers.
+        """
+        self._rendered = None
+        self._rendered_markers = None
+
+    def digest(self):
+        """
+        Function which hashes the content of the rendered wave and markers,
+        eg to find identical waveforms. For waveforms made of segments the
+        digest is cached until the segments or markers change.
+
+        Returns:
+            hex digest (str)
+        """
+        if self.segment_list is not None:
+            key = (self._render_key(), self._markers_version)
+            if self._digest is not None and self._digest[0] == key:
+                return self._digest[1]
+        h = hashlib.blake2b(digest_size=16)
+        h.update(np.ascontiguousarray(self._read_wave(), dtype=float))
+        markers = self.markers
+        for i in [1, 2]:
+            h.update(np.ascontiguousarray(markers[i]))
+        digest = h.hexdigest()
+        if self.segment_list is not None:
+            self._digest = (key, digest)
+        return digest
+
+    def pack(self, amplitude: float = 1.0, out: np.ndarray = None):
+        """
+        Function which packs the wave and markers into the AWG5014 uint16
+        format (see awg.pack_waveform).
+
+        Args:
+            amplitude: wave value corresponding to full scale (default 1)
+            out: optional uint16 array to write into
+
+        Returns:
+            packed (uint16 numpy array)
+            clipped (int): number of samples clipped
+        """
+        markers = self.markers
+        return pack_waveform(self._read_wave(), markers[1], markers[2],
+                             amplitude=amplitude, out=out)
 
     def add_marker(self, marker_num: int, delay: int, duration: int):
         """
@@ -155,9 +604,9 @@ class Waveform:
             delay: number of points from start of wave
             duration: number of points for marker to be on for
         """
-        if self.wave is None:
+        if self.segment_list is None and self._wave is None:
             raise RuntimeError('cannot set marker before setting wave')
-        elif len(self.wave) < (delay + duration):
+        elif len(self) < (delay + duration):
             raise RuntimeError('end of marker is beyond end of wave')
         elif marker_num not in [1, 2]:
             raise RuntimeError('marker number not in (1, 2)')
@@ -169,14 +618,20 @@ class Waveform:
                                  'duration_points': []},
                              2: {'delay_points': [],
                                  'duration_points': []}}
+        elif self._markers_shared:
+            self._markers = copy.deepcopy(self._markers)
+        self._markers_shared = False
         self._markers[marker_num]['delay_points'].append(delay)
         self._markers[marker_num]['duration_points'].append(duration)
+        self._markers_version = next(_versions)
 
     def clear_wave_markers(self):
         """
         Clears markers associated with the wave.
         """
         self._markers = None
+        self._markers_shared = False
+        self._markers_version = next(_versions)
 
     def clear_segment_markers(self):
         """
@@ -211,13 +666,14 @@ class Waveform:
                                    'waveform SR: {}, segment SR: {}'.format(
                                        self.sample_rate,
                                        segment.func_args["SR"]))
+        self._rendered = None
         if self._wave is None:
             if self.segment_list is None:
-                self.segment_list = [copy.deepcopy(segment)]
+                self.segment_list = [segment.copy()]
             elif position is None:
-                self.segment_list.append(copy.deepcopy(segment))
+                self.segment_list.append(segment.copy())
             else:
-                self.segment_list.insert(position, copy.deepcopy(segment))
+                self.segment_list.insert(position, segment.copy())
         elif position is not None:
             raise RuntimeError('Cannot insert segment into indexed position'
                                ' if the waveform is not defined by a segment '
@@ -226,40 +682,61 @@ class Waveform:
             for i in [1, 2]:
                 delays = np.array(segment.markers[i]['delay_points'])
                 durations = segment.markers[i]['duration_points']
-                new_delays = list(delays + len(self.wave))
+                new_delays = list(delays + len(self))
                 self._markers[i]['delay_points'].append(new_delays)
                 self._markers[i]['duration_points'].append(durations)
             np.append(self._wave, segment.points)
 
+    @profiled('copy')
     def copy(self):
-        return copy.deepcopy(self)
+        """
+        Function which returns a copy of the waveform which shares the
+        explicit wave, wave marker table, rendered arrays and (via
+        Segment.copy) segment points and markers with this one. Whichever
+        is mutated first makes its own private copy.
 
-    def plot(self, subplot=None):
+        Returns:
+            Waveform
         """
-        Plots the wave and markers in a matplotlib.pyplot subplot
+        new = copy.copy(self)
+        if self.segment_list is not None:
+            new.segment_list = [s.copy() for s in self.segment_list]
+        if self._wave is not None:
+            self._wave_shared = new._wave_shared = True
+        if self._markers is not None:
+            self._markers_shared = new._markers_shared = True
+        return new
+
+    def plot(self, subplot=None, max_points: int = None, start: int = 0,
+             stop: int = None):
+        """
+        Plots the wave and markers in a matplotlib.pyplot subplot. Long
+        waveforms are drawn as a min/max envelope (see plotting.envelope)
+        so that edges and marker transitions stay visible.
 
         Args:
             subplot to plot on, otherwise makes a new figure
+            max_points: maximum number of points to draw, by default two
+                per pixel of the subplot width
+            start: first point to plot (default 0)
+            stop: point after the last to plot (default the end), only
+                the segments in the window are rendered (see render)
 
         Returns:
             plot
         """
         if subplot is None:
             try:
-                fig, ax = plt.subplots()
-            except NameError as e:
+                fig, ax = pyplot().subplots()
+            except Exception as e:
                 raise Warning('Could not create matplot figure {}'.format(e))
         else:
             ax = subplot
         if self.channel is not None:
             ax.set_title('Channel {}'.format(self.channel))
         ax.set_ylim([-1.1, 1.1])
-        ax.plot(self.wave, lw=1,
-                color='#009FFF', label='wave')
-        ax.plot(self.markers[1], lw=1,
-                color='#008B45', alpha=0.6, label='m1')
-        ax.plot(self.markers[2], lw=1,
-                color='#FE6447', alpha=0.6, label='m2')
+        plot_waveform(self, ax, max_points=max_points, start=start,
+                      stop=stop)
         ax.legend(loc='upper right', fontsize=10)
         if subplot is None:
             return fig
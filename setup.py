@@ -4,7 +4,7 @@ setup(
     name='chickpea',
     version='0.1',
 
-    install_requires=['numpy>=1.12.1',
+    install_requires=['numpy>=1.16',
                       'matplotlib>=2.0.1'],
 
     author='Natalie Pearson',
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from chickpea import Segment, Waveform, Element, Sequence
+from chickpea import segment_functions as sf
+
+SR = 1e9
+
+
+def _template():
+    template = Element(sample_rate=SR)
+    drive = Waveform(channel=1)
+    drive.add_segment(Segment(gen_func=sf.flat,
+                              func_args={'amp': 0, 'dur': 2e-8}))
+    pulse = Segment(gen_func=sf.gaussian,
+                    func_args={'sigma': 5e-9, 'sigma_cutoff': 2, 'amp': 1})
+    pulse.add_bound_marker(1, 0, 10)
+    drive.add_segment(pulse)
+    drive.add_segment(Segment(gen_func=sf.flat,
+                              func_args={'amp': 0, 'dur': 6e-8}))
+    template.add_waveform(drive)
+    readout = Waveform(channel=2)
+    readout_segment = Segment(gen_func=sf.flat,
+                              func_args={'amp': 0.2, 'dur': 1e-7})
+    readout_segment.add_bound_marker(2, 5, 20)
+    readout.add_segment(readout_segment)
+    template.add_waveform(readout)
+    return template
+
+
+@pytest.fixture
+def template():
+    """
+    Element of two channels, a gaussian pulse padded to 100 points on
+    channel 1 and a flat readout with a marker on channel 2.
+    """
+    return _template()
+
+
+@pytest.fixture
+def sequence():
+    """
+    Sequence sweeping the amplitude of the gaussian pulse over 4 values
+    (one repeated) with the readout channel shared by all elements.
+    """
+    return Sequence.sweep(_template(), [(1, 1, 'amp', [0.1, 0.5, 0.5, 1])],
+                          sample_rate=SR)
+
+
+@pytest.fixture
+def reference_unwrap():
+    """
+    Returns a function giving the waves and markers of each channel of
+    each element of a sequence, built from scratch by calling the
+    generator function of every segment.
+    """
+    def unwrap(sequence):
+        waves = {}
+        for element in sequence:
+            for ch, waveform in element.items():
+                wave = np.concatenate([seg.func(**seg.func_args)
+                                       for seg in waveform.segment_list])
+                markers = {1: np.zeros(len(wave)), 2: np.zeros(len(wave))}
+                start = 0
+                for seg in waveform.segment_list:
+                    for m in [1, 2]:
+                        for delay, duration in zip(
+                                seg.markers[m]['delay_points'],
+                                seg.markers[m]['duration_points']):
+                            markers[m][start + delay:
+                                       start + delay + duration] = 1
+                    start += len(seg.func(**seg.func_args))
+                waves.setdefault(ch, []).append(
+                    (wave, markers[1], markers[2]))
+        return waves
+    return unwrap
@@ -0,0 +1,135 @@
+import io
+import struct
+
+import numpy as np
+import pytest
+
+from chickpea import awg, Sequence
+
+
+def _reference_pack(wave, m1, m2, amplitude):
+    half = awg.DAC_MAX / 2
+    codes = np.floor(np.clip(wave * half / amplitude + half + 0.5,
+                             0.5, awg.DAC_MAX + 0.5)).astype(np.uint16)
+    return (codes + m1.astype(np.uint16) * awg.M1_BIT +
+            m2.astype(np.uint16) * awg.M2_BIT)
+
+
+@pytest.mark.parametrize('length', [1, 1000, 3 * 2**16 + 7])
+def test_pack_waveform_matches_reference(length):
+    rng = np.random.RandomState(length)
+    wave = rng.uniform(-1.2, 1.2, length)
+    m1 = rng.randint(0, 2, length).astype(np.uint8)
+    m2 = rng.randint(0, 2, length).astype(np.uint8)
+    packed, clipped = awg.pack_waveform(wave, m1, m2, amplitude=0.8)
+    assert packed.dtype == np.uint16
+    np.testing.assert_array_equal(packed,
+                                  _reference_pack(wave, m1, m2, 0.8))
+    assert clipped == np.count_nonzero(np.abs(wave) > 0.8)
+
+
+def test_pack_waveform_full_scale():
+    zeros = np.zeros(3, dtype=np.uint8)
+    packed, clipped = awg.pack_waveform(np.array([-1., 0., 1.]), zeros,
+                                        np.ones(3, dtype=np.uint8))
+    np.testing.assert_array_equal(
+        packed, [awg.M2_BIT, awg.M2_BIT + awg.DAC_MAX // 2,
+                 awg.M2_BIT + awg.DAC_MAX])
+    assert clipped == 0
+    with pytest.raises(ValueError):
+        awg.pack_waveform(np.zeros(3), zeros[:2], zeros)
+
+
+def test_unwrap_packed(sequence):
+    amplitude = {1: 1.0, 2: 0.1}
+    packed, stats = sequence.unwrap_packed(amplitude=amplitude)
+    waves, m1s, m2s, *seq_lists, channels = sequence.unwrap()[0]
+    assert packed[0][-1] == channels
+    for i, ch in enumerate(channels):
+        for j in range(len(sequence)):
+            np.testing.assert_array_equal(
+                packed[0][0][i][j],
+                _reference_pack(waves[i][j], m1s[i][j], m2s[i][j],
+                                amplitude[ch]))
+    assert stats['samples'] == 2 * 4 * 100
+    assert {ch for j, ch in stats['clipped_waveforms']} == {2}
+
+
+def _released(sequence):
+    return all(not waveform._is_rendered()
+               for element in sequence for waveform in element.values())
+
+
+def test_awg_file_round_trip(sequence, tmp_path):
+    sequence.nreps = [1, 2, 3, 4]
+    path = str(tmp_path / 'sequence.awg')
+    stats = sequence.write_awg_file(path, amplitude={1: 1.0, 2: 0.5})
+    assert stats['waveforms'] == 4
+    assert stats['clipped'] == 0
+    awg_file = awg.read_awg_file(path)
+    assert len(awg_file) == 4
+    assert awg_file.channels == [1, 2]
+    assert awg_file.settings['SAMPLING_RATE'] == sequence.sample_rate
+    loaded = Sequence.from_awg_file(path)
+    assert loaded.sample_rate == sequence.sample_rate
+    assert loaded.nreps == [1, 2, 3, 4]
+    waves, m1s, m2s, *seq_lists, channels = sequence.unwrap()[0]
+    for i, (ch, amp) in enumerate([(1, 1.0), (2, 0.5)]):
+        for j, element in enumerate(loaded):
+            np.testing.assert_allclose(element[ch].wave * amp, waves[i][j],
+                                       atol=1 / awg.DAC_MAX)
+            np.testing.assert_array_equal(element[ch].markers[1], m1s[i][j])
+            np.testing.assert_array_equal(element[ch].markers[2], m2s[i][j])
+
+
+def test_write_awg_file_releases_waveforms(sequence):
+    sequence.write_awg_file(io.BytesIO())
+    assert _released(sequence)
+
+
+def test_write_awg_file_keeps_rendered_waveforms(sequence):
+    for element in sequence:
+        for waveform in element.values():
+            waveform.wave
+    sequence.write_awg_file(io.BytesIO(), deduplicate=False)
+    assert not any(_released([element]) for element in sequence)
+
+
+def _real_awg_file(path, kind=awg.REAL):
+    data = np.zeros(4, dtype=awg._REAL_DTYPE)
+    data['wave'] = [-0.5, 0, 0.25, 1]
+    data['markers'] = [awg.REAL_M1_BIT, 0, awg.REAL_M2_BIT,
+                       awg.REAL_M1_BIT | awg.REAL_M2_BIT]
+    data_name = b'WAVEFORM_DATA_21\x00'
+    with open(path, 'wb') as f:
+        f.write(awg._pack_record('MAGIC', 5000, 'h') +
+                awg._pack_record('SAMPLING_RATE', 1.2e9, 'd') +
+                awg._pack_record('WAVEFORM_NAME_21', 'real', 's') +
+                awg._pack_record('WAVEFORM_TYPE_21', kind, 'h') +
+                awg._pack_record('WAVEFORM_LENGTH_21', 4, 'l') +
+                struct.pack('<II', len(data_name), data.nbytes) +
+                data_name + data.tobytes() +
+                awg._pack_record('SEQUENCE_LOOP_1', 1, 'l') +
+                awg._pack_record('SEQUENCE_WAVEFORM_NAME_CH_1_1', 'real',
+                                 's'))
+
+
+def test_read_real_waveform(tmp_path):
+    path = str(tmp_path / 'real.awg')
+    _real_awg_file(path)
+    awg_file = awg.read_awg_file(path)
+    assert awg_file.waveform_types['real'] == awg.REAL
+    wave, m1, m2 = awg_file.waveform('real')
+    np.testing.assert_array_equal(wave, [-0.5, 0, 0.25, 1])
+    np.testing.assert_array_equal(m1, [1, 0, 0, 1])
+    np.testing.assert_array_equal(m2, [0, 0, 1, 1])
+    with pytest.raises(ValueError):
+        awg_file.packed('real')
+    assert Sequence.from_awg_file(path).sample_rate == 1.2e9
+
+
+def test_unsupported_waveform_type(tmp_path):
+    path = str(tmp_path / 'bad.awg')
+    _real_awg_file(path, kind=3)
+    with pytest.raises(ValueError, match='WAVEFORM_TYPE'):
+        awg.read_awg_file(path)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from chickpea import Sequence
+from chickpea import segment_functions as sf
+from chickpea.segment import points_cache
+
+SR = 1e9
+
+SWEEPS = [
+    (sf.ramp, {'start': 0, 'stop': 1, 'dur': 1e-7}, 'stop', [0.5, 1, 2]),
+    (sf.ramp, {'start': 0, 'stop': 1, 'dur': 1e-7}, 'dur',
+     [1e-8, 3.3e-8, 1e-7]),
+    (sf.flat, {'amp': 1, 'dur': 1e-7}, 'amp', [0, 0.3, 1]),
+    (sf.flat, {'amp': 1, 'dur': 1e-7}, 'dur', [1e-8, 2e-8, 0]),
+    (sf.gaussian, {'sigma': 1e-8, 'sigma_cutoff': 2, 'amp': 1}, 'sigma',
+     [3e-9, 1e-8, 2.5e-8]),
+    (sf.gaussian_derivative, {'sigma': 1e-8, 'sigma_cutoff': 2, 'amp': 1},
+     'amp', [-1, 0.5, 2]),
+    (sf.stairs, {'start': 0, 'stop': 1, 'step': 0.25, 'dur': 1e-7}, 'stop',
+     [0.5, 1, 2]),
+]
+
+
+@pytest.mark.parametrize('func, args, arg, values', SWEEPS)
+def test_batch_evaluate_matches_generator(func, args, arg, values):
+    args = dict(args, SR=SR)
+    points, lengths = sf.batch_evaluate(
+        func, arg, values, **{k: v for k, v in args.items() if k != arg})
+    assert points.shape == (len(values), max(lengths))
+    for row, length, value in zip(points, lengths, values):
+        expected = func(**dict(args, **{arg: value}))
+        assert length == len(expected)
+        np.testing.assert_allclose(row[:length], expected, rtol=1e-12,
+                                   atol=1e-15)
+        assert not row[length:].any()
+
+
+def test_sweep_prerender_seeds_cache(template, reference_unwrap):
+    points_cache.clear()
+    sequence = Sequence.sweep(template, [(1, 1, 'amp', [0.1, 0.5, 1])],
+                              prerender=True)
+    entries = len(points_cache)
+    assert entries >= 3
+    reference = reference_unwrap(sequence)
+    for element, (wave, m1, m2) in zip(sequence, reference[1]):
+        np.testing.assert_allclose(element[1].wave, wave, rtol=1e-12)
+    assert len(points_cache) == entries + 2
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from chickpea import Segment, CompositeSegment, Waveform
+from chickpea import segment_functions as sf
+
+SR = 1e9
+
+
+def _segments():
+    flat = Segment(name='flat', gen_func=sf.flat,
+                   func_args={'amp': 0.5, 'dur': 2e-8})
+    flat.add_bound_marker(1, 5, 10)
+    ramp = Segment(name='ramp', gen_func=sf.ramp,
+                   func_args={'start': 0, 'stop': 1, 'dur': 3e-8})
+    ramp.add_bound_marker(1, 1e-9, 2e-9, time=True)
+    explicit = Segment(name='explicit', points_array=np.arange(7.))
+    explicit.add_bound_marker(2, 0, 7)
+    return flat, ramp, explicit
+
+
+def _concatenated(segments):
+    points = np.concatenate([s.func(**dict(s.func_args, SR=SR))
+                             if s.func is not None else s._read_points()
+                             for s in segments])
+    markers = {1: np.zeros(len(points)), 2: np.zeros(len(points))}
+    start = 0
+    for s in segments:
+        s = s.copy()
+        if s.func is not None:
+            s.func_args['SR'] = SR
+        for m in [1, 2]:
+            for delay, duration in zip(s.markers[m]['delay_points'],
+                                       s.markers[m]['duration_points']):
+                markers[m][start + delay:start + delay + duration] = 1
+        start += len(s)
+    return points, markers
+
+
+def _waveform(segment):
+    waveform = Waveform(sample_rate=SR)
+    waveform.add_segment(segment)
+    return waveform
+
+
+def test_composite_matches_concatenated():
+    segments = _segments()
+    composite = segments[0] + segments[1] + segments[2]
+    assert isinstance(composite, CompositeSegment)
+    assert composite.name == 'flat_ramp_explicit'
+    waveform = _waveform(composite)
+    points, markers = _concatenated(segments)
+    assert len(waveform) == len(points) == 57
+    np.testing.assert_array_equal(waveform.wave, points)
+    for m in [1, 2]:
+        np.testing.assert_array_equal(waveform.markers[m], markers[m])
+
+
+def test_composite_points_read_only():
+    flat, ramp, explicit = _segments()
+    composite = explicit + explicit
+    np.testing.assert_array_equal(composite.points,
+                                  np.tile(np.arange(7.), 2))
+    with pytest.raises(ValueError):
+        composite.points[0] = 1
+    with pytest.raises(RuntimeError):
+        composite.points = np.zeros(3)
+
+
+def test_composite_children_edits():
+    flat, ramp, explicit = _segments()
+    waveform = _waveform(flat + ramp)
+    before = waveform.wave
+    new = waveform.copy()
+    composite = waveform.segment_list[0]
+    composite.children[0].func_args['amp'] = 0.25
+    after = waveform.wave
+    assert after is not before
+    np.testing.assert_array_equal(after[:20], 0.25 * np.ones(20))
+    np.testing.assert_array_equal(new.wave, before)
+
+
+def test_long_chain_does_not_recurse():
+    segment = Segment(points_array=np.ones(2))
+    composite = segment
+    for _ in range(5000):
+        composite = composite + segment
+    assert len(composite) == 10002
+    np.testing.assert_array_equal(composite.points, np.ones(10002))
+
+
+def test_different_sample_rates_raise():
+    flat, ramp, explicit = _segments()
+    flat.func_args['SR'] = 1e9
+    ramp.func_args['SR'] = 2e9
+    with pytest.raises(RuntimeError):
+        flat + ramp
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from chickpea import Segment, Waveform, Element, Sequence
+from chickpea import segment_functions as sf
+from chickpea.compressed import CompressedWave
+
+
+def test_from_array_round_trip():
+    array = np.concatenate([np.zeros(1000), np.linspace(0, 1, 50),
+                            0.3 * np.ones(200), [1., 2.]])
+    wave = CompressedWave.from_array(array, min_run=64)
+    assert len(wave) == len(array)
+    assert wave.nbytes < wave.dense_nbytes / 10
+    np.testing.assert_array_equal(wave.to_array(), array)
+    np.testing.assert_array_equal(np.asarray(wave), array)
+    np.testing.assert_array_equal(wave[990:1060], array[990:1060])
+    np.testing.assert_array_equal(wave.to_array(1040, 1250),
+                                  array[1040:1250])
+    assert wave == CompressedWave.from_array(array, min_run=64)
+
+
+def test_from_intervals():
+    marker = CompressedWave.from_intervals(100, np.array([10, 15, 80]),
+                                           np.array([20, 30, 120]))
+    expected = np.zeros(100)
+    expected[10:30] = expected[80:] = 1
+    np.testing.assert_array_equal(marker.to_array(), expected)
+
+
+def test_compress_explicit_wave():
+    waveform = Waveform(length=10000)
+    waveform.add_marker(1, 100, 50)
+    dense_markers = waveform.markers
+    waveform.compress()
+    assert isinstance(waveform._wave, CompressedWave)
+    assert len(waveform) == 10000
+    np.testing.assert_array_equal(waveform.markers[1], dense_markers[1])
+    np.testing.assert_array_equal(waveform.wave, np.zeros(10000))
+    assert isinstance(waveform.wave, np.ndarray)
+
+
+def test_render_compressed_skips_constant_segments(template, monkeypatch):
+    waveform = template[1]
+    waveform.segment_list[1].add_bound_marker(2, 5, 30)
+    expected = waveform.wave, waveform.markers
+    waveform._release()
+    generated = []
+    for seg in waveform.segment_list:
+        read_points = seg._read_points
+        monkeypatch.setattr(seg, '_read_points',
+                            lambda read_points=read_points, seg=seg: (
+                                generated.append(seg) or read_points()))
+    wave, markers = waveform.render_compressed(min_run=4)
+    assert generated == [waveform.segment_list[1]]
+    np.testing.assert_array_equal(wave.to_array(), expected[0])
+    for m in [1, 2]:
+        np.testing.assert_array_equal(markers[m].to_array(), expected[1][m])
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_compressed_unwrap_matches_dense(sequence, workers):
+    dense = sequence.unwrap()[0]
+    compressed = sequence.unwrap(compressed=True, workers=workers)[0]
+    for k in range(3):
+        for x, y in zip(dense[k], compressed[k]):
+            for array, wave in zip(x, y):
+                assert isinstance(wave, CompressedWave)
+                np.testing.assert_array_equal(wave.to_array(), array)
+    for k in range(3, 8):
+        np.testing.assert_array_equal(dense[k], compressed[k])
+
+
+def test_compressed_unwrap_is_small():
+    waveform = Waveform(sample_rate=1e9)
+    waveform.add_segment(Segment(gen_func=sf.flat,
+                                 func_args={'amp': 0, 'dur': 1e-5}))
+    waveform.add_segment(Segment(gen_func=sf.ramp,
+                                 func_args={'start': 0, 'stop': 1,
+                                            'dur': 1e-8}))
+    sequence = Sequence(sample_rate=1e9)
+    for _ in range(3):
+        element_waveform = waveform.copy()
+        element_waveform.channel = 1
+        element = Element()
+        element.add_waveform(element_waveform)
+        sequence.add_element(element)
+    waves = sequence.unwrap(compressed=True)[0][0][0]
+    assert sum(w.nbytes for w in waves) < 3 * 10010 * 8 / 50
@@ -0,0 +1,64 @@
+import numpy as np
+
+from chickpea import Segment, Waveform, Element
+from chickpea import segment_functions as sf
+
+SR = 1e9
+
+
+def test_segment_copy_shares_until_edited():
+    segment = Segment(points_array=np.zeros(10))
+    segment.add_bound_marker(1, 2, 3)
+    new = segment.copy()
+    assert new._read_points() is segment._read_points()
+    new.points[0] = 1
+    new.add_bound_marker(2, 0, 4)
+    np.testing.assert_array_equal(segment.points, np.zeros(10))
+    assert segment.markers[2] == {'delay_points': [],
+                                  'duration_points': []}
+    assert new.markers[1] == segment.markers[1]
+    assert new.points[0] == 1
+
+
+def test_waveform_copy_isolated():
+    waveform = Waveform(length=10, sample_rate=SR)
+    waveform.add_marker(1, 0, 5)
+    new = waveform.copy()
+    new.wave[1] = 1
+    new.add_marker(2, 3, 4)
+    np.testing.assert_array_equal(waveform.wave, np.zeros(10))
+    np.testing.assert_array_equal(waveform.markers[2], np.zeros(10))
+    np.testing.assert_array_equal(new.markers[1], waveform.markers[1])
+    assert new.wave[1] == 1
+
+
+def test_segment_waveform_copy_isolated():
+    waveform = Waveform(sample_rate=SR)
+    waveform.add_segment(Segment(points_array=np.zeros(10)))
+    waveform.add_segment(
+        Segment(gen_func=sf.flat, func_args={'amp': 0.5, 'dur': 1e-8}))
+    wave = waveform.wave
+    new = waveform.copy()
+    assert new.wave is wave
+    new.segment_list[0].points[0] = 1
+    new.segment_list[1].func_args['amp'] = 0.25
+    np.testing.assert_array_equal(waveform.wave, wave)
+    assert waveform.wave is wave
+    assert new.wave[0] == 1
+    np.testing.assert_array_equal(new.wave[10:], 0.25 * np.ones(10))
+
+
+def test_element_copy_isolated():
+    element = Element(sample_rate=SR)
+    element.add_waveform(Waveform(length=10, channel=1))
+    new = element.copy()
+    new[1].wave[0] = 1
+    assert element[1].wave[0] == 0
+
+
+def test_points_setter_renders_again():
+    waveform = Waveform(sample_rate=SR)
+    waveform.add_segment(Segment(points_array=np.zeros(10)))
+    waveform.wave
+    waveform.segment_list[0].points = np.arange(5.)
+    np.testing.assert_array_equal(waveform.wave, np.arange(5.))
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+
+def test_element_render_matches_waveforms(sequence):
+    element = sequence[1]
+    waves, markers = element.render()
+    assert waves.shape == (2, 100)
+    assert markers.shape == (2, 2, 100)
+    assert markers.dtype == np.uint8
+    assert element[1]._rendered is None
+    for i, ch in enumerate([1, 2]):
+        np.testing.assert_array_equal(waves[i], element[ch].wave)
+        for m in [1, 2]:
+            np.testing.assert_array_equal(markers[i, m - 1],
+                                          element[ch].markers[m])
+    again, again_markers = element.render(channels=[2, 1])
+    np.testing.assert_array_equal(again, waves[::-1])
+    np.testing.assert_array_equal(again_markers, markers[::-1])
+
+
+def test_element_render_into_given_arrays(sequence):
+    out = np.full((2, 100), np.nan)
+    markers_out = np.full((2, 2, 100), 7, dtype=np.uint8)
+    waves, markers = sequence[0].render(out=out, markers_out=markers_out)
+    assert waves is out and markers is markers_out
+    assert not np.isnan(out).any()
+    assert markers_out.max() == 1
+    with pytest.raises(ValueError):
+        sequence[0].render(out=np.empty((2, 99)))
+
+
+def test_element_render_unequal_lengths(sequence):
+    sequence[0][1].segment_list[0].func_args['dur'] = 1e-8
+    with pytest.raises(RuntimeError, match='not of equal length'):
+        sequence[0].render()
+
+
+@pytest.mark.parametrize('memory_mapped', [False, True])
+def test_sequence_render(sequence, tmp_path, memory_mapped):
+    path = str(tmp_path) if memory_mapped else None
+    waves, markers = sequence.render(path=path)
+    assert waves.shape == (4, 2, 100)
+    assert markers.shape == (4, 2, 2, 100)
+    if memory_mapped:
+        assert isinstance(waves, np.memmap)
+        reopened = np.load(str(tmp_path / 'waves.npy'))
+        np.testing.assert_array_equal(reopened, waves)
+    for j, element in enumerate(sequence):
+        element_waves, element_markers = element.render()
+        np.testing.assert_array_equal(waves[j], element_waves)
+        np.testing.assert_array_equal(markers[j], element_markers)
+
+
+def test_sequence_render_unequal_lengths(sequence):
+    sequence[3][1].segment_list[0].func_args['dur'] = 1e-8
+    sequence[3][2].segment_list[0].func_args['dur'] = 9e-8
+    with pytest.raises(ValueError, match='same length'):
+        sequence.render()
+
+
+def test_contiguous_unwrap(sequence, tmp_path):
+    dense = sequence.unwrap()[0]
+    contiguous = sequence.unwrap(contiguous=True, path=str(tmp_path))[0]
+    for k in range(3):
+        for x, y in zip(dense[k], contiguous[k]):
+            for array, view in zip(x, y):
+                assert isinstance(view.base, np.memmap)
+                np.testing.assert_array_equal(view, array)
+    for k in range(3, 8):
+        np.testing.assert_array_equal(dense[k], contiguous[k])
+
+
+@pytest.mark.parametrize('options', [
+    {'contiguous': True, 'workers': 2},
+    {'contiguous': True, 'compressed': True},
+    {'path': 'unused'}])
+def test_contiguous_unwrap_options(sequence, options):
+    with pytest.raises(ValueError):
+        sequence.unwrap(**options)
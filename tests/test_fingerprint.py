@@ -0,0 +1,37 @@
+import json
+
+from chickpea import Sequence
+
+
+def test_fingerprint_is_serialisable(sequence):
+    fingerprint = sequence.fingerprint()
+    assert fingerprint['channels'] == [1, 2]
+    assert len(fingerprint['digests']) == len(fingerprint['table']) == 4
+    assert json.loads(json.dumps(fingerprint)) == fingerprint
+
+
+def test_delta_unchanged(sequence):
+    delta = sequence.delta(json.loads(json.dumps(sequence.fingerprint())))
+    assert delta['new'] == {}
+    assert delta['changed'] == delta['table_rows'] == []
+    assert delta['removed'] == set()
+    assert delta['removed_rows'] == 0
+    assert len(delta['reusable']) == 4
+
+
+def test_delta_changed(sequence, template):
+    previous = sequence.fingerprint()
+    sequence[3][1].segment_list[1].func_args['amp'] = 0.1
+    sequence.nreps = [1, 5, 1, 1]
+    delta = sequence.delta(previous)
+    assert delta['new'] == {}
+    assert delta['changed'] == [(3, 1)]
+    assert delta['table_rows'] == [1, 3]
+    assert delta['removed'] == {previous['digests'][3][0]}
+
+    longer = Sequence.sweep(template, [(1, 1, 'amp', [0.1, 0.5, 0.5, 1,
+                                                      0.7])])
+    delta = longer.delta(previous)
+    assert list(delta['new'].values()) == [(4, 1)]
+    assert delta['table_rows'] == [3, 4]
+    assert sequence.delta(longer)['removed_rows'] == 1
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from chickpea import Sequence, LazySequence
+
+AXES = [(1, 1, 'amp', [0.1, 0.5, 0.5, 1])]
+
+
+def _assert_unwrapped_equal(a, b):
+    for k in range(3):
+        for x, y in zip(a[k], b[k]):
+            for wave_x, wave_y in zip(x, y):
+                np.testing.assert_array_equal(wave_x, wave_y)
+    for k in range(3, 8):
+        np.testing.assert_array_equal(a[k], b[k])
+
+
+def test_lazy_sweep_matches_eager(template):
+    eager = Sequence.sweep(template, AXES)
+    lazy = Sequence.sweep(template, AXES, lazy=True)
+    assert isinstance(lazy, LazySequence)
+    assert len(lazy) == len(eager)
+    np.testing.assert_array_equal(lazy.variable_array, eager.variable_array)
+    _assert_unwrapped_equal(lazy.unwrap()[0], eager.unwrap()[0])
+    assert lazy.check()
+    assert lazy.fingerprint() == eager.fingerprint()
+
+
+def test_lazy_elements_made_on_demand(template):
+    made = []
+
+    def update(element, index):
+        made.append(index)
+        element[1].segment_list[1].func_args['amp'] = index / 10
+
+    lazy = LazySequence.from_template(template, 100, update, cache_size=2)
+    assert made == []
+    lazy[5]
+    lazy[5]
+    lazy[-1]
+    assert made == [5, 99]
+    lazy[6]
+    lazy[5]
+    assert made == [5, 99, 6, 5]
+    assert lazy[7][1].segment_list[1].func_args['amp'] == 0.7
+    assert template[1].segment_list[1].func_args['amp'] == 1
+    for _ in lazy.iter_unwrap():
+        pass
+    assert len(lazy._elements._cache) == 2
+
+
+def test_lazy_sequence_is_read_only(template):
+    lazy = Sequence.sweep(template, AXES, lazy=True)
+    with pytest.raises(TypeError):
+        lazy[0] = template
+    with pytest.raises(TypeError):
+        lazy.add_element(template)
+    with pytest.raises(IndexError):
+        lazy[4]
@@ -0,0 +1,63 @@
+import numpy as np
+
+from chickpea import Segment, Waveform
+from chickpea import segment_functions as sf
+
+SR = 1e9
+
+
+def _reference(length, intervals):
+    marker = np.zeros(length, dtype=np.uint8)
+    for delay, duration in intervals:
+        marker[delay:delay + duration] = 1
+    return marker
+
+
+def _waveform():
+    waveform = Waveform(sample_rate=SR)
+    first = Segment(gen_func=sf.flat, func_args={'amp': 0.5, 'dur': 1e-7})
+    first.add_bound_marker(1, 10, 20)
+    first.add_bound_marker(1, 25, 10)
+    second = Segment(gen_func=sf.flat, func_args={'amp': 0.1, 'dur': 1e-7})
+    second.add_bound_marker(2, 1e-8, 5e-8, time=True)
+    waveform.add_segment(first)
+    waveform.add_segment(second)
+    return waveform
+
+
+def test_markers_match_reference():
+    waveform = _waveform()
+    waveform.add_marker(1, 150, 50)
+    markers = waveform.markers
+    assert markers[1].dtype == np.uint8
+    np.testing.assert_array_equal(
+        markers[1], _reference(200, [(10, 20), (25, 10), (150, 50)]))
+    np.testing.assert_array_equal(markers[2], _reference(200, [(110, 50)]))
+
+
+def test_markers_cached_until_changed():
+    waveform = _waveform()
+    before = waveform.markers
+    assert waveform.markers[1] is before[1]
+    waveform.add_marker(2, 0, 5)
+    after = waveform.markers
+    assert after[2] is not before[2]
+    np.testing.assert_array_equal(
+        after[2], _reference(200, [(0, 5), (110, 50)]))
+    waveform.segment_list[0].clear_markers()
+    np.testing.assert_array_equal(waveform.markers[1], np.zeros(200))
+    waveform.clear_wave_markers()
+    np.testing.assert_array_equal(waveform.markers[2],
+                                  _reference(200, [(110, 50)]))
+
+
+def test_raw_marker_edges():
+    raw = np.array([1, 1, 0, 0, 1, 0, 1, 1])
+    points = Segment._raw_to_points({1: raw})[1]
+    assert points == {'delay_points': [0, 4, 6],
+                      'duration_points': [2, 1, 2]}
+    segment = Segment(points_array=np.zeros(len(raw)))
+    segment.add_raw_marker(2, raw)
+    waveform = Waveform(sample_rate=SR)
+    waveform.add_segment(segment)
+    np.testing.assert_array_equal(waveform.markers[2], raw)
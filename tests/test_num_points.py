@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from chickpea import Segment, Waveform
+from chickpea import segment_functions as sf
+from chickpea.segment import points_cache
+
+SR = 1e9
+
+GENERATORS = [
+    (sf.ramp, {'start': 0, 'stop': 1, 'dur': 1.5e-7}),
+    (sf.gaussian, {'sigma': 1e-8, 'sigma_cutoff': 2.5, 'amp': 1}),
+    (sf.stairs, {'start': 0, 'stop': 1, 'step': 0.3, 'dur': 1e-7}),
+    (sf.flat, {'amp': 1, 'dur': 2.3e-7}),
+    (sf.gaussian_derivative, {'sigma': 1e-8, 'sigma_cutoff': 3, 'amp': 1}),
+]
+
+
+@pytest.mark.parametrize('func, args', GENERATORS)
+def test_num_points_matches_generated(func, args):
+    args = dict(args, SR=SR)
+    assert func.num_points(**args) == len(func(**args))
+
+
+def test_len_does_not_generate_points():
+    points_cache.clear()
+    calls = []
+
+    @sf.num_points(lambda dur, SR, **kwargs: int(round(SR * dur)))
+    def counted(dur, SR):
+        calls.append(dur)
+        return np.zeros(int(round(SR * dur)))
+
+    segment = Segment(gen_func=counted, func_args={'dur': 1e-7, 'SR': SR})
+    waveform = Waveform(sample_rate=SR)
+    waveform.add_segment(segment)
+    assert len(segment) == 100
+    assert len(waveform) == 100
+    assert segment.duration == pytest.approx(1e-7)
+    assert calls == []
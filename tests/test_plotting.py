@@ -0,0 +1,47 @@
+import subprocess
+import sys
+
+import numpy as np
+
+from chickpea import plotting
+
+
+def test_import_does_not_load_matplotlib():
+    code = ('import sys, chickpea; '
+            'print(any(m.startswith("matplotlib") for m in sys.modules))')
+    out = subprocess.check_output([sys.executable, '-c', code])
+    assert out.strip() == b'False'
+
+
+def test_envelope_short_arrays_unchanged():
+    y = np.arange(10.)
+    x, kept = plotting.envelope(y, 10)
+    np.testing.assert_array_equal(x, np.arange(10))
+    np.testing.assert_array_equal(kept, y)
+
+
+def test_envelope_keeps_extremes_and_edges():
+    y = np.zeros(100001)
+    y[12345] = 1
+    y[70000:70003] = -1
+    y[-1] = 0.5
+    x, kept = plotting.envelope(y, 200)
+    assert len(x) <= 204
+    assert np.all(np.diff(x) > 0)
+    np.testing.assert_array_equal(kept, y[x])
+    assert x[0] == 0 and x[-1] == len(y) - 1
+    assert 12345 in x
+    assert kept.min() == -1
+    marker = np.zeros(100001, dtype=np.uint8)
+    marker[500:90000] = 1
+    x, kept = plotting.envelope(marker, 200)
+    assert kept[0] == 0 and kept[-1] == 0
+    assert list(kept).count(1) >= 2
+
+
+def test_waveform_plot(sequence):
+    plotting.pyplot().switch_backend('Agg')
+    waveform = sequence[0][1]
+    ax = waveform.plot(max_points=20)
+    assert ax is not None
+    plotting.pyplot().close('all')
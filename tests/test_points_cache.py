@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from chickpea import Segment
+from chickpea import segment_functions as sf
+from chickpea.segment import PointsCache, points_cache
+
+SR = 1e9
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    points_cache.clear()
+    yield
+    points_cache.clear()
+
+
+def _flat(amp=0.5, dur=1e-6):
+    return Segment(gen_func=sf.flat,
+                   func_args={'amp': amp, 'dur': dur, 'SR': SR})
+
+
+def test_identical_segments_share_points():
+    first = _flat()
+    second = _flat()
+    assert first.points is second.points
+    assert not first.points.flags.writeable
+    assert points_cache.info()['entries'] == 1
+
+
+def test_func_args_change_gives_new_points():
+    segment = _flat()
+    before = segment.points
+    segment.func_args['amp'] = 0.25
+    after = segment.points
+    assert after is not before
+    np.testing.assert_array_equal(after, sf.flat(0.25, 1e-6, SR))
+    segment.func_args.update({'amp': 0.5})
+    assert segment.points is before
+
+
+def test_unhashable_args_bypass_cache():
+    segment = Segment(gen_func=lambda amps, SR: np.array(amps),
+                      func_args={'amps': [1, 2, 3], 'SR': SR})
+    np.testing.assert_array_equal(segment.points, [1, 2, 3])
+    assert len(points_cache) == 0
+
+
+def test_eviction_by_max_bytes():
+    cache = PointsCache(max_bytes=2 * 8 * 10)
+    for i in range(3):
+        cache.put(i, np.zeros(10))
+    assert 0 not in cache
+    assert 1 in cache and 2 in cache
+    assert cache.nbytes == 2 * 8 * 10
+    cache.put(3, np.zeros(100))
+    assert 3 not in cache
@@ -0,0 +1,40 @@
+import pytest
+
+from chickpea import profiling, Sequence
+from chickpea.segment import points_cache
+
+
+@pytest.fixture(autouse=True)
+def profiler():
+    profiling.reset()
+    points_cache.clear()
+    yield profiling.profiler
+    profiling.disable()
+    profiling.reset()
+
+
+def test_disabled_records_nothing(sequence):
+    sequence.unwrap()
+    assert profiling.stats() == {}
+
+
+def test_stages_recorded(sequence):
+    profiling.enable()
+    sequence.unwrap()
+    stats = Sequence.render_stats(reset=True)
+    assert stats['unwrap']['calls'] == 1
+    assert stats['points.gaussian']['calls'] == 3
+    assert stats['wave']['calls'] == stats['markers']['calls'] == 5
+    assert stats['wave']['returned_bytes'] == 5 * 100 * 8
+    assert stats['markers']['returned_bytes'] == 5 * 2 * 100
+    assert stats['unwrap']['time'] >= stats['wave']['time']
+    assert profiling.stats() == {}
+
+
+def test_summary(sequence):
+    profiling.enable()
+    sequence.unwrap()
+    lines = profiling.summary().splitlines()
+    assert lines[0].split()[:3] == ['stage', 'calls', 'time']
+    assert 'returned MB' in lines[0]
+    assert len(lines) == len(profiling.stats()) + 1
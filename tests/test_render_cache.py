@@ -0,0 +1,65 @@
+import numpy as np
+
+from chickpea import Segment, Waveform
+from chickpea import segment_functions as sf
+
+SR = 1e9
+
+
+def _waveform(*segments):
+    waveform = Waveform(sample_rate=SR)
+    for segment in segments:
+        waveform.add_segment(segment)
+    return waveform
+
+
+def test_wave_rendered_once():
+    waveform = _waveform(
+        Segment(gen_func=sf.flat, func_args={'amp': 0.5, 'dur': 1e-7}),
+        Segment(gen_func=sf.ramp,
+                func_args={'start': 0, 'stop': 1, 'dur': 1e-7}))
+    wave = waveform.wave
+    assert waveform.wave is wave
+    assert not wave.flags.writeable
+    np.testing.assert_array_equal(
+        wave, np.concatenate([sf.flat(0.5, 1e-7, SR),
+                              sf.ramp(0, 1, 1e-7, SR)]))
+
+
+def test_func_args_edit_renders_again():
+    waveform = _waveform(
+        Segment(gen_func=sf.flat, func_args={'amp': 0.5, 'dur': 1e-7}))
+    segment = waveform.segment_list[0]
+    before = waveform.wave
+    segment.func_args['amp'] = 0.25
+    after = waveform.wave
+    assert after is not before
+    np.testing.assert_array_equal(after, sf.flat(0.25, 1e-7, SR))
+
+
+def test_func_edit_renders_again():
+    waveform = _waveform(
+        Segment(gen_func=sf.flat, func_args={'amp': 0.5, 'dur': 1e-7}))
+    segment = waveform.segment_list[0]
+    waveform.wave
+    segment.func = sf.ramp
+    segment.func_args = {'start': 0, 'stop': 1, 'dur': 1e-7, 'SR': SR}
+    np.testing.assert_array_equal(waveform.wave, sf.ramp(0, 1, 1e-7, SR))
+
+
+def test_in_place_points_edit_renders_again():
+    waveform = _waveform(Segment(points_array=np.zeros(10)))
+    segment = waveform.segment_list[0]
+    np.testing.assert_array_equal(waveform.wave, np.zeros(10))
+    segment.points[3] = 1
+    expected = np.zeros(10)
+    expected[3] = 1
+    np.testing.assert_array_equal(waveform.wave, expected)
+
+
+def test_rendering_does_not_invalidate():
+    waveform = _waveform(Segment(points_array=np.zeros(10)))
+    wave = waveform.wave
+    len(waveform)
+    list(waveform.segment_list[0])
+    assert waveform.wave is wave
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from chickpea import Sequence
+
+SR = 1e9
+
+
+def test_sweep_outer_product(template):
+    sequence = Sequence.sweep(template, [(1, 1, 'amp', [0.1, 0.2, 0.3]),
+                                         (1, 1, 'sigma', [4e-9, 5e-9])])
+    assert len(sequence) == 6
+    np.testing.assert_array_equal(sequence.variable_arrays[0],
+                                  [0.1, 0.1, 0.2, 0.2, 0.3, 0.3])
+    np.testing.assert_array_equal(sequence.variable_array,
+                                  sequence.variable_arrays[0])
+    for element, amp, sigma in zip(sequence, *sequence.variable_arrays):
+        func_args = element[1].segment_list[1].func_args
+        assert (func_args['amp'], func_args['sigma']) == (amp, sigma)
+        assert element[2] is sequence[0][2]
+    assert template[1].segment_list[1].func_args['amp'] == 1
+
+
+def test_sweep_shares_unvaried_waveforms(template):
+    sequence = Sequence.sweep(template, [(1, 1, 'amp', [0.1, 0.5]),
+                                         (2, 0, 'amp', [0.2, 0.3, 0.4])])
+    assert len(sequence) == 6
+    assert all(sequence[i][1] is sequence[0][1] for i in range(3))
+    assert sequence[3][1] is not sequence[0][1]
+    assert len(set(id(e[2]) for e in sequence)) == 3
+
+
+def test_sweep_zipped(template):
+    sequence = Sequence.sweep(template, [(1, 1, 'amp', [0.1, 0.5, 0.6]),
+                                         (2, 0, 'amp', [0.2, 0.3, 0.4])],
+                              zipped=True)
+    assert len(sequence) == 3
+    for element, amp1, amp2 in zip(sequence, *sequence.variable_arrays):
+        assert element[1].segment_list[1].func_args['amp'] == amp1
+        assert element[2].segment_list[0].func_args['amp'] == amp2
+    with pytest.raises(ValueError):
+        Sequence.sweep(template, [(1, 1, 'amp', [0.1, 0.5]),
+                                  (2, 0, 'amp', [0.2])], zipped=True)
+
+
+def test_sweep_compensates_duration(template, reference_unwrap):
+    sequence = Sequence.sweep(template,
+                              [(1, 1, 'sigma', [3e-9, 5e-9, 8e-9], 2)])
+    for element in sequence:
+        assert len(element[1]) == len(template[1])
+    for wave, m1, m2 in reference_unwrap(sequence)[1]:
+        assert len(wave) == len(template[1])
+    with pytest.raises(ValueError):
+        Sequence.sweep(template, [(1, 1, 'sigma', [3e-8], 2)])
+
+
+def test_wrap_round_trip(sequence, reference_unwrap):
+    sequence.nreps = [1, 2, 1, 3]
+    sequence.goto_states = [2, 3, 4, 1]
+    unwrapped = sequence.unwrap()
+    assert len(unwrapped) == 1
+    wrapped = Sequence()
+    wrapped.wrap((unwrapped[0], {}))
+    assert len(wrapped) == len(sequence)
+    assert wrapped.nreps == [1, 2, 1, 3]
+    reference = reference_unwrap(sequence)
+    for ch in [1, 2]:
+        for element, (wave, m1, m2) in zip(wrapped, reference[ch]):
+            np.testing.assert_array_equal(element[ch].wave, wave)
+            np.testing.assert_array_equal(element[ch].markers[1], m1)
+            np.testing.assert_array_equal(element[ch].markers[2], m2)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from chickpea import Sequence
+
+
+def test_save_load_round_trip(sequence, tmp_path):
+    sequence.name = 'rabi'
+    sequence.labels = {'qubit': 2}
+    sequence.nreps = [1, 2, 3, 4]
+    sequence.save(str(tmp_path))
+    loaded = Sequence.load(str(tmp_path))
+    assert loaded.name == 'rabi'
+    assert loaded.labels == {'qubit': 2}
+    assert loaded.sample_rate == sequence.sample_rate
+    assert loaded.nreps == [1, 2, 3, 4]
+    np.testing.assert_array_equal(loaded.variable_arrays[0],
+                                  sequence.variable_arrays[0])
+    original = sequence.unwrap()[0]
+    reloaded = loaded.unwrap()[0]
+    for k in range(3):
+        for a, b in zip(original[k], reloaded[k]):
+            for x, y in zip(a, b):
+                np.testing.assert_array_equal(x, y)
+    for k in range(3, 8):
+        np.testing.assert_array_equal(original[k], reloaded[k])
+
+
+def test_loaded_waves_are_memory_mapped(sequence, tmp_path):
+    sequence.save(str(tmp_path))
+    loaded = Sequence.load(str(tmp_path))
+    waveform = loaded[1][1]
+    assert isinstance(waveform._read_wave().base, np.memmap)
+    waveform.wave[0] = 5
+    assert Sequence.load(str(tmp_path))[1][1].wave[0] == \
+        sequence[1][1].wave[0]
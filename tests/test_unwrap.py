@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+
+from chickpea import Segment, Waveform, Sequence
+from chickpea import segment_functions as sf
+
+
+def _check_unwrapped(unwrapped, reference):
+    waves, m1s, m2s = unwrapped[0][:3]
+    channels = unwrapped[0][-1]
+    assert channels == sorted(reference)
+    for i, ch in enumerate(channels):
+        assert len(waves[i]) == len(reference[ch])
+        for wave, m1, m2, expected in zip(waves[i], m1s[i], m2s[i],
+                                          reference[ch]):
+            np.testing.assert_allclose(wave, expected[0], rtol=1e-12)
+            np.testing.assert_array_equal(m1, expected[1])
+            np.testing.assert_array_equal(m2, expected[2])
+
+
+def test_unwrap_matches_reference(sequence, reference_unwrap):
+    unwrapped = sequence.unwrap()
+    _check_unwrapped(unwrapped, reference_unwrap(sequence))
+    assert list(unwrapped[0][3]) == [1] * 4
+    assert list(unwrapped[0][5]) == [2, 3, 4, 1]
+
+
+def test_unwrap_deduplicated_matches_unwrap(sequence):
+    unwrapped = sequence.unwrap()[0]
+    deduplicated, stats = sequence.unwrap_deduplicated()
+    table, indices, *seq_lists, channels = deduplicated[0]
+    assert indices.shape == (2, 4)
+    assert len(table) == 4
+    assert stats['waveforms'] == 8
+    assert stats['unique_waveforms'] == 4
+    assert stats['bytes_saved'] == stats['bytes'] - stats['unique_bytes'] > 0
+    for i in range(len(channels)):
+        for j in range(len(sequence)):
+            for k in range(3):
+                np.testing.assert_array_equal(table[indices[i, j]][k],
+                                              unwrapped[k][i][j])
+    for a, b in zip(seq_lists, unwrapped[3:7]):
+        np.testing.assert_array_equal(a, b)
+    assert channels == unwrapped[7]
+
+
+def test_digest_tracks_content():
+    first = Waveform(sample_rate=1e9)
+    first.add_segment(Segment(gen_func=sf.flat,
+                              func_args={'amp': 0.5, 'dur': 1e-7}))
+    second = Waveform(sample_rate=1e9)
+    second.wave = 0.5 * np.ones(100)
+    assert first.digest() == second.digest()
+    first.add_marker(1, 0, 5)
+    assert first.digest() != second.digest()
+    second.add_marker(1, 0, 5)
+    assert first.digest() == second.digest()
+    first.segment_list[0].func_args['amp'] = 0.25
+    assert first.digest() != second.digest()
+
+
+def test_unwrap_second_awg(template):
+    template[5] = template[1].copy()
+    template[5].channel = 5
+    sequence = Sequence.sweep(template, [(5, 1, 'amp', [0.1, 0.2])])
+    unwrapped = sequence.unwrap()
+    assert [u[-1] for u in unwrapped] == [[1, 2], [1]]
+    np.testing.assert_array_equal(unwrapped[1][0][0][1],
+                                  sequence[1][5].wave)
+
+
+def test_iter_unwrap_matches_unwrap(sequence):
+    waves, m1s, m2s, *seq_lists, channels = sequence.unwrap()[0]
+    rows = list(sequence.iter_unwrap())
+    assert [j for j, _, _ in rows] == list(range(len(sequence)))
+    for j, rendered, row in rows:
+        assert sorted(rendered) == channels
+        for i, ch in enumerate(channels):
+            np.testing.assert_array_equal(rendered[ch][0], waves[i][j])
+            np.testing.assert_array_equal(rendered[ch][1], m1s[i][j])
+            np.testing.assert_array_equal(rendered[ch][2], m2s[i][j])
+        assert row == tuple(int(lst[j]) for lst in seq_lists)
+
+
+def test_iter_unwrap_renders_shared_waveforms_once(sequence, monkeypatch):
+    renders = []
+    render = Waveform._render
+
+    def counted(waveform):
+        renders.append(id(waveform))
+        return render(waveform)
+
+    monkeypatch.setattr(Waveform, '_render', counted)
+    for _ in sequence.iter_unwrap():
+        pass
+    assert len(renders) == len(set(renders)) == 5
+    for element in sequence:
+        for waveform in element.values():
+            assert not waveform._is_rendered()
+
+
+def test_iter_unwrap_keeps_rendered_and_releases_on_close(sequence):
+    kept = sequence[0][1]
+    kept.wave
+    rows = sequence.iter_unwrap()
+    next(rows)
+    next(rows)
+    rows.close()
+    assert kept._is_rendered()
+    for element in sequence:
+        for ch, waveform in element.items():
+            assert waveform is kept or not waveform._is_rendered()
+
+
+def _assert_unwrapped_equal(a, b):
+    assert len(a) == len(b)
+    for x, y in zip(a, b):
+        for k in range(3):
+            for i in range(len(x[k])):
+                for wave_x, wave_y in zip(x[k][i], y[k][i]):
+                    np.testing.assert_array_equal(wave_x, wave_y)
+        for k in range(3, 8):
+            np.testing.assert_array_equal(x[k], y[k])
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_parallel_unwrap_matches_serial(sequence, backend):
+    serial = sequence.unwrap()
+    for element in sequence:
+        for waveform in element.values():
+            waveform._release()
+    _assert_unwrapped_equal(sequence.unwrap(workers=2, backend=backend),
+                            serial)
+
+
+def test_process_unwrap_falls_back_for_lambdas(template, caplog):
+    template[2].segment_list[0].func = \
+        lambda amp, dur, SR: sf.flat(amp, dur, SR)
+    sequence = Sequence.sweep(template, [(1, 1, 'amp', [0.1, 0.2])])
+    serial = sequence.unwrap()
+    for element in sequence:
+        for waveform in element.values():
+            waveform._release()
+    _assert_unwrapped_equal(sequence.unwrap(workers=2, backend='process'),
+                            serial)
+    assert 'falling back to threads' in caplog.text
+
+
+def test_parallel_check(sequence):
+    assert sequence.check(workers=2)
+    sequence[2][1].segment_list[0].func_args['dur'] = 1e-8
+    with pytest.raises(Exception, match='element 2'):
+        sequence.check(workers=2)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from chickpea import Waveform
+
+
+@pytest.fixture
+def no_render(monkeypatch):
+    def render(waveform):
+        raise AssertionError('validation rendered a waveform')
+    monkeypatch.setattr(Waveform, '_render', render)
+
+
+def test_validate_does_not_render(sequence, no_render):
+    report = sequence.validate()
+    assert report.ok
+    assert sequence.check()
+
+
+def test_validation_cached_until_mutated(sequence, no_render):
+    assert sequence.validate().validated == 0
+    sequence[2][1].segment_list[0].func_args['dur'] = 3e-8
+    report = sequence.validate()
+    assert report.validated == 1
+    assert [index for index, _ in report.errors] == [2]
+    assert 'not of equal length' in report.errors[0][1]
+    assert sequence.validate().validated == 0
+
+
+def test_table_settings_errors(sequence):
+    sequence.goto_states = np.array([2, 3, 4, 1])
+    assert sequence.validate().ok
+    sequence.nreps = [1, 2]
+    sequence.jump_tos = [1, 1, 1]
+    sequence[0][1].segment_list[0].func_args['dur'] = 3e-8
+    report = sequence.validate()
+    messages = report.messages()
+    assert len(messages) == 3
+    assert any(m.startswith('nreps') for m in messages)
+    assert any(m.startswith('jump_tos') for m in messages)
+    assert any(m.startswith('error in element 0') for m in messages)
+    with pytest.raises(RuntimeError) as info:
+        sequence.check()
+    assert all(m in str(info.value) for m in messages)
+
+
+def test_parallel_validate(sequence):
+    sequence[1][1].segment_list[2].func_args['dur'] = 1e-8
+    report = sequence.validate(workers=2)
+    assert [index for index, _ in report.errors] == [1]
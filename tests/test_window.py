@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from chickpea import Waveform
+
+
+@pytest.fixture
+def waveform(template):
+    waveform = template[1]
+    waveform.segment_list[1].add_bound_marker(2, 15, 10)
+    return waveform
+
+
+def test_segment_at(waveform):
+    assert waveform.segment_at(0) == (0, 0)
+    assert waveform.segment_at(19) == (0, 19)
+    assert waveform.segment_at(20) == (1, 0)
+    assert waveform.segment_at(99) == (2, 59)
+    assert waveform.segment_at_time(4.5e-8) == (2, 5)
+    with pytest.raises(IndexError):
+        waveform.segment_at(100)
+
+
+@pytest.mark.parametrize('start, stop', [(0, 100), (10, 30), (25, 38),
+                                         (39, 41), (50, 50), (90, 100)])
+def test_render_window_matches_full(waveform, start, stop):
+    expected = waveform.wave[start:stop], waveform.markers
+    waveform._release()
+    wave, markers = waveform.render(start, stop)
+    assert not waveform._is_rendered()
+    np.testing.assert_array_equal(wave, expected[0])
+    for m in [1, 2]:
+        np.testing.assert_array_equal(markers[m],
+                                      expected[1][m][start:stop])
+    waveform.wave
+    wave, markers = waveform.render(start, stop)
+    np.testing.assert_array_equal(wave, expected[0])
+
+
+def test_render_window_generates_overlapping_segments_only(waveform,
+                                                           monkeypatch):
+    generated = []
+    for seg in waveform.segment_list:
+        read_points = seg._read_points
+        monkeypatch.setattr(seg, '_read_points',
+                            lambda read_points=read_points, seg=seg: (
+                                generated.append(seg) or read_points()))
+    waveform.render(0, 15)
+    assert generated == [waveform.segment_list[0]]
+
+
+def test_render_window_explicit_wave():
+    waveform = Waveform(length=10)
+    waveform.add_marker(1, 2, 5)
+    wave, markers = waveform.render(4, 8)
+    np.testing.assert_array_equal(wave, np.zeros(4))
+    np.testing.assert_array_equal(markers[1], [1, 1, 1, 0])
+    with pytest.raises(IndexError):
+        waveform.render(5, 11)